@@ -3,10 +3,11 @@
 # 2 is a block tile. Blocks can be broken by the ball.
 # 3 is a horizontal paddle tile. The paddle is indestructible.
 # 4 is a ball tile. The ball moves diagonally and bounces off objects.
-from collections import deque
-from intcode import IntCode, DequeIO, IO
+from intcode import HALTED, IntCode, DequeIO, RingIO, configure_engine
+from intcode_loader import load_program
 
 IntCode.DEBUG = False
+configure_engine()
 EMPTY, WALL, BLOCK, PADDLE, BALL = range(5)
 
 
@@ -14,51 +15,46 @@ class ArcadeCabinet:
     def __init__(self, code):
         # self.display = display
         self.code = code
-        self.intcode = IntCode(code, input_buffer=DequeIO(), output_buffer=DequeIO())
+        self.pristine = IntCode(code, input_buffer=DequeIO(), output_buffer=RingIO())
+        self.intcode = self.pristine.fork()
 
         self.tiles = []
         self.score = 0
 
     def reset(self):
         self.score = 0
-        self.intcode = IntCode(self.code, input_buffer=DequeIO(), output_buffer=DequeIO())
+        self.intcode = self.pristine.fork()
 
     def run_and_count_block_tiles(self):
-        while not self.intcode.done:
-            while not self.intcode.done and len(self.intcode.output_buffer) < 3:
-                self.intcode.tick()
-            if self.intcode.done:
-                break
-            self.tiles.append(tuple(self.intcode.output_buffer))
-            self.intcode.output_buffer.clear()
+        self.intcode.execute()
+        outputs = iter(self.intcode.output_buffer.drain())
+        self.tiles.extend(zip(outputs, outputs, outputs))
 
         return sum(1 for x, y, tile_id in self.tiles if tile_id == 2)
 
     def run(self):
-        self.intcode.memory[0] = 2
+        self.intcode.write_memory(0, 2)
         inp = 0
         ball_x = 0
         paddle_x = 0
         tiles = {}
-        while not self.intcode.done:
-            out = self.intcode.run_until_out([], 3)
-            if out is None:
-                self.intcode.input_buffer.add(inp)
-                continue
-
-            x, y, tid = out
-
-            if tid == BALL:
-                ball_x = x
-            elif tid == PADDLE:
-                paddle_x = x
-
-            if (x, y) == (-1, 0):
-                self.score = tid
-                if BLOCK not in tiles.values():
-                    return self.score
-            else:
+        while True:
+            self.intcode.input_buffer.add(inp)
+            status = self.intcode.execute()
+            # Everything drawn since the last joystick input, in one go.
+            outputs = iter(self.intcode.output_buffer.drain())
+            for x, y, tid in zip(outputs, outputs, outputs):
+                if (x, y) == (-1, 0):
+                    self.score = tid
+                    continue
                 tiles[(x, y)] = tid
+                if tid == BALL:
+                    ball_x = x
+                elif tid == PADDLE:
+                    paddle_x = x
+
+            if status == HALTED or BLOCK not in tiles.values():
+                return self.score
 
             if ball_x == paddle_x:
                 inp = 0
@@ -90,8 +86,7 @@ def display(tiles):
         print(''.join(line))
 
 
-with open('day13_input.txt', 'r') as f:
-    input_data = [int(c) for c in f.read().split(',')]
+input_data = load_program('day13_input.txt')
 
 ac = ArcadeCabinet(input_data)
 print(f'[PART 1] BLOCK TILES: {ac.run_and_count_block_tiles()}')
@@ -1,133 +1,13 @@
-INPUT_MAX = 99
-DEBUG = False
+from intcode import configure_engine
+from intcode_cache import ResultCache, cached_run
+from intcode_loader import load_program
 
-def dprint(*args, **kwargs):
-    if DEBUG:
-        print(*args, **kwargs)
+configure_engine()
+cache = ResultCache.from_environment()
 
-
-class IntCode:    
-    def __init__(self, memory):
-        self.ip = 0
-        self.memory = memory[:]
-        self.parameter_modes = []
-        self.running = False
-        self.opcodes = {
-            1: self.add,
-            2: self.mul,
-            3: self.input,
-            4: self.output,
-            5: self.jump_if_true,
-            6: self.jump_if_false,
-            7: self.less_than,
-            8: self.equals,
-            99: self.halt,
-        }
-
-    def get_parameter_address(self):
-        try:
-            parameter_mode = self.parameter_modes.pop()
-        except IndexError:
-            parameter_mode = 0
-            
-        if parameter_mode == 1:
-            address = self.ip
-        else:
-            address = self.memory[self.ip]
-        #dprint(f'GET PARAMETER ADDRESS: mode={parameter_mode}, memory_value={self.memory[self.ip]}, address={address}')        
-        self.ip += 1
-        return address
-
-    def jump_if_true(self):
-        self.ip += 1
-        a = self.get_parameter_address()
-        b = self.get_parameter_address()
-        if self.memory[a]:
-            self.ip = self.memory[b]
-            dprint(f'JT(a={a}, b={b}) DO JUMP')
-        else:
-            dprint(f'JT(a={a}, b={b}) DON\'T JUMP')
-            
-    def jump_if_false(self):
-        self.ip += 1
-        a = self.get_parameter_address()
-        b = self.get_parameter_address()
-        if not self.memory[a]:
-            self.ip = self.memory[b]
-            dprint(f'JF(a={a}, b={b}) DO JUMP')
-        else:
-            dprint(f'JF(a={a}, b={b}) DON\'T JUMP')
-    
-    def less_than(self):
-        self.ip += 1
-        a, b, c = (
-            self.get_parameter_address(),
-            self.get_parameter_address(),
-            self.get_parameter_address(),
-        )
-        dprint(f'LT(a={a}, b={b}, c={c})')
-        self.memory[c] = int(self.memory[a] < self.memory[b])
-    
-    def equals(self):
-        self.ip += 1
-        a, b, c = (
-            self.get_parameter_address(),
-            self.get_parameter_address(),
-            self.get_parameter_address(),
-        )
-        dprint(f'EQ(a={a}, b={b}, c={c})')
-        self.memory[c] = int(self.memory[a] == self.memory[b])
-    
-    def input(self):
-        self.ip += 1
-        self.memory[self.get_parameter_address()] = int(input())
-        
-    def output(self):
-        self.ip += 1
-        print(self.memory[self.get_parameter_address()])
-    
-    def add(self):
-        self.ip += 1
-        a, b, c = (
-            self.get_parameter_address(),
-            self.get_parameter_address(),
-            self.get_parameter_address(),
-        )
-        dprint(f'ADD(a={a}, b={b}, c={c})')
-        self.memory[c] = self.memory[a] + self.memory[b]
-        
-    def mul(self):
-        self.ip += 1
-        a, b, c = (
-            self.get_parameter_address(),
-            self.get_parameter_address(),
-            self.get_parameter_address(),
-        )
-        dprint(f'MUL(a={a}, b={b}, c={c})')
-        self.memory[c] = self.memory[a] * self.memory[b]
-        
-    def halt(self):        
-        self.running = False
-
-    def run_program(self, noun, verb):
-        self.memory[1] = noun
-        self.memory[2] = verb
-        return self.run()
-
-    def run(self):
-        self.running = True
-        while self.running:
-            dprint(f'INSTRUCTION POINTER: {self.ip}')
-            opcode = self.memory[self.ip] % 100
-            self.parameter_modes += [int(d) for d in str(self.memory[self.ip])[:-2]]
-            dprint(f'OPCODE: {opcode} ({self.opcodes.get(opcode).__name__}), PRM_MODES={self.parameter_modes!r}')
-            self.opcodes.get(opcode)()
-        return self.memory[0]
-
-
-memory = [3,225,1,225,6,6,1100,1,238,225,104,0,1101,37,61,225,101,34,121,224,1001,224,-49,224,4,224,102,8,223,223,1001,224,6,224,1,224,223,223,1101,67,29,225,1,14,65,224,101,-124,224,224,4,224,1002,223,8,223,101,5,224,224,1,224,223,223,1102,63,20,225,1102,27,15,225,1102,18,79,224,101,-1422,224,224,4,224,102,8,223,223,1001,224,1,224,1,223,224,223,1102,20,44,225,1001,69,5,224,101,-32,224,224,4,224,1002,223,8,223,101,1,224,224,1,223,224,223,1102,15,10,225,1101,6,70,225,102,86,40,224,101,-2494,224,224,4,224,1002,223,8,223,101,6,224,224,1,223,224,223,1102,25,15,225,1101,40,67,224,1001,224,-107,224,4,224,102,8,223,223,101,1,224,224,1,223,224,223,2,126,95,224,101,-1400,224,224,4,224,1002,223,8,223,1001,224,3,224,1,223,224,223,1002,151,84,224,101,-2100,224,224,4,224,102,8,223,223,101,6,224,224,1,224,223,223,4,223,99,0,0,0,677,0,0,0,0,0,0,0,0,0,0,0,1105,0,99999,1105,227,247,1105,1,99999,1005,227,99999,1005,0,256,1105,1,99999,1106,227,99999,1106,0,265,1105,1,99999,1006,0,99999,1006,227,274,1105,1,99999,1105,1,280,1105,1,99999,1,225,225,225,1101,294,0,0,105,1,0,1105,1,99999,1106,0,300,1105,1,99999,1,225,225,225,1101,314,0,0,106,0,0,1105,1,99999,108,677,677,224,1002,223,2,223,1006,224,329,101,1,223,223,1107,677,226,224,102,2,223,223,1006,224,344,101,1,223,223,8,677,677,224,1002,223,2,223,1006,224,359,101,1,223,223,1008,677,677,224,1002,223,2,223,1006,224,374,101,1,223,223,7,226,677,224,1002,223,2,223,1006,224,389,1001,223,1,223,1007,677,677,224,1002,223,2,223,1006,224,404,1001,223,1,223,7,677,677,224,1002,223,2,223,1006,224,419,1001,223,1,223,1008,677,226,224,1002,223,2,223,1005,224,434,1001,223,1,223,1107,226,677,224,102,2,223,223,1005,224,449,1001,223,1,223,1008,226,226,224,1002,223,2,223,1006,224,464,1001,223,1,223,1108,677,677,224,102,2,223,223,1006,224,479,101,1,223,223,1108,226,677,224,1002,223,2,223,1006,224,494,1001,223,1,223,107,226,226,224,1002,223,2,223,1006,224,509,1001,223,1,223,8,226,677,224,102,2,223,223,1006,224,524,1001,223,1,223,1007,226,226,224,1002,223,2,223,1006,224,539,1001,223,1,223,107,677,677,224,1002,223,2,223,1006,224,554,1001,223,1,223,1107,226,226,224,102,2,223,223,1005,224,569,101,1,223,223,1108,677,226,224,1002,223,2,223,1006,224,584,1001,223,1,223,1007,677,226,224,1002,223,2,223,1005,224,599,101,1,223,223,107,226,677,224,102,2,223,223,1005,224,614,1001,223,1,223,108,226,226,224,1002,223,2,223,1005,224,629,101,1,223,223,7,677,226,224,102,2,223,223,1005,224,644,101,1,223,223,8,677,226,224,102,2,223,223,1006,224,659,1001,223,1,223,108,677,226,224,102,2,223,223,1005,224,674,1001,223,1,223,4,223,99,226]
-ic = IntCode(memory)
-x = ic.run()
+memory = load_program('day5_input.txt')
 
 # PART 1: Pass in "1" as input.
 # PART 2: Pass in "5" as input.
+print(f'DIAGNOSTIC CODE (AIR CONDITIONER): {cached_run(memory, [1], cache)[-1]}')
+print(f'DIAGNOSTIC CODE (THERMAL RADIATORS): {cached_run(memory, [5], cache)[-1]}')
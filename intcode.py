@@ -1,4 +1,11 @@
 import abc
+import argparse
+import asyncio
+import copy
+import importlib
+import os
+import sys
+from array import array
 from collections import deque
 
 
@@ -27,6 +34,15 @@ class IO(metaclass=abc.ABCMeta):
     def extend(self, iterable):
         pass
 
+    @abc.abstractmethod
+    def copy(self):
+        pass
+
+    def drain(self, n=None):
+        """Remove and return the next `n` items, all of them by default, as a sequence."""
+        n = len(self) if n is None else min(n, len(self))
+        return tuple(self.pop() for _ in range(n))
+
 
 class DequeIO(IO):
 
@@ -51,18 +67,566 @@ class DequeIO(IO):
     def extend(self, iterable):
         self.deque.extend(iterable)
 
+    def copy(self):
+        return DequeIO(self.deque)
+
+    def drain(self, n=None):
+        if n is None or n >= len(self.deque):
+            items = tuple(self.deque)
+            self.clear()
+            return items
+        return super().drain(n)
+
+
+class AsyncIO(DequeIO):
+    """Channel for VMs running as asyncio tasks, consumers can await new items with wait()."""
+
+    def __init__(self, input_values=None):
+        super().__init__(input_values)
+        self.ready = asyncio.Event()
+        if self.deque:
+            self.ready.set()
+
+    def add(self, item):
+        self.deque.append(item)
+        self.ready.set()
+
+    def pop(self):
+        item = self.deque.popleft()
+        if not self.deque:
+            self.ready.clear()
+        return item
+
+    def clear(self):
+        self.deque.clear()
+        self.ready.clear()
+
+    def extend(self, iterable):
+        self.deque.extend(iterable)
+        if self.deque:
+            self.ready.set()
+
+    def copy(self):
+        return AsyncIO(self.deque)
+
+    async def wait(self):
+        await self.ready.wait()
+
+
+class RingIO(IO):
+    """FIFO of ints in a preallocated array('q') ring buffer, which doubles when full.
+
+    extend() and drain() move whole slices of the array at once instead of
+    one boxed int at a time, which makes consuming long output streams
+    cheap: drain() returns a copied array('q') slice, whose items are only
+    turned into Python ints as they are read. Once a value does not fit
+    into int64 the buffer turns into a list with the same layout and
+    drain() returns lists.
+    """
+
+    def __init__(self, input_values=None, capacity=1024):
+        self.buffer = array('q', bytes(8 * max(capacity, 1)))
+        self.head = 0
+        self.count = 0
+        if input_values is not None:
+            self.extend(input_values)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.peek())
+
+    def add(self, item):
+        capacity = len(self.buffer)
+        if self.count == capacity:
+            self.resize(2 * capacity)
+            capacity *= 2
+        index = self.head + self.count
+        if index >= capacity:
+            index -= capacity
+        try:
+            self.buffer[index] = item
+        except OverflowError:
+            self.buffer = self.buffer.tolist()
+            self.buffer[index] = item
+        self.count += 1
+
+    def pop(self):
+        if not self.count:
+            raise IndexError('pop from an empty RingIO')
+        item = self.buffer[self.head]
+        self.head = (self.head + 1) % len(self.buffer)
+        self.count -= 1
+        return item
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def extend(self, iterable):
+        if isinstance(self.buffer, array):
+            values = iterable if isinstance(iterable, (list, tuple)) else list(iterable)
+            try:
+                values = array('q', values)
+            except OverflowError:
+                self.buffer = self.buffer.tolist()
+        else:
+            values = list(iterable)
+        if self.count + len(values) > len(self.buffer):
+            self.resize(max(self.count + len(values), 2 * len(self.buffer)))
+        capacity = len(self.buffer)
+        tail = (self.head + self.count) % capacity
+        first = min(len(values), capacity - tail)
+        self.buffer[tail:tail + first] = values[:first]
+        self.buffer[:len(values) - first] = values[first:]
+        self.count += len(values)
+
+    def copy(self):
+        return RingIO(self.peek(), len(self.buffer))
+
+    def peek(self, n=None):
+        """The next `n` items, all of them by default, as an array('q') or list slice."""
+        n = self.count if n is None else min(n, self.count)
+        end = self.head + n
+        capacity = len(self.buffer)
+        if end <= capacity:
+            return self.buffer[self.head:end]
+        return self.buffer[self.head:] + self.buffer[:end - capacity]
+
+    def drain(self, n=None):
+        items = self.peek(n)
+        self.head = (self.head + len(items)) % len(self.buffer)
+        self.count -= len(items)
+        return items
+
+    def resize(self, capacity):
+        items = self.peek()
+        buffer = array('q', bytes(8 * capacity)) if isinstance(self.buffer, array) else [0] * capacity
+        buffer[:len(items)] = items
+        self.buffer = buffer
+        self.head = 0
+
+
+PAGE_BITS = 10
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+ZERO_PAGE = (0,) * PAGE_SIZE
+
+
+class PagedMemory:
+    """Sparse Intcode memory; pages are only allocated when first written.
+
+    Pages may be shared with forks, only the pages listed in `owned` are
+    private to this memory and can be written in place. Negative addresses
+    raise IndexError.
+    """
+
+    def __init__(self, values=()):
+        self.pages = {}
+        for start in range(0, len(values), PAGE_SIZE):
+            page = list(values[start:start + PAGE_SIZE])
+            page.extend(ZERO_PAGE[len(page):])
+            self.pages[start >> PAGE_BITS] = self.make_page(page)
+        self.owned = set(self.pages)
+
+    @staticmethod
+    def make_page(values):
+        """New private page holding `values`."""
+        return list(values)
+
+    def __getitem__(self, address):
+        if address < 0:
+            raise IndexError(f'Negative address {address}')
+        return self.pages.get(address >> PAGE_BITS, ZERO_PAGE)[address & PAGE_MASK]
+
+    def __setitem__(self, address, value):
+        if address < 0:
+            raise IndexError(f'Negative address {address}')
+        index = address >> PAGE_BITS
+        if index not in self.owned:
+            self.pages[index] = self.make_page(self.pages.get(index, ZERO_PAGE))
+            self.owned.add(index)
+        try:
+            self.pages[index][address & PAGE_MASK] = value
+        except OverflowError:
+            # An int64 page receiving a bigint, only this page turns into a list.
+            page = self.pages[index] = self.pages[index].tolist()
+            page[address & PAGE_MASK] = value
+
+    def fork(self):
+        child = self.__class__()
+        child.pages = dict(self.pages)
+        self.owned.clear()
+        return child
+
+
+class Int64PagedMemory(PagedMemory):
+    """PagedMemory keeping its pages in array('q') instead of lists of boxed ints.
+
+    A page takes 8 bytes per word rather than a pointer plus an int object
+    for every value outside the small int cache. A page holding a value
+    beyond int64 is a list, so results never change; every other page
+    stays compact.
+    """
+
+    @staticmethod
+    def make_page(values):
+        try:
+            return array('q', values)
+        except OverflowError:
+            return list(values)
+
+
+OPERAND_COUNTS = {
+    1: 3,
+    2: 3,
+    3: 1,
+    4: 1,
+    5: 2,
+    6: 2,
+    7: 3,
+    8: 3,
+    9: 1,
+    99: 0,
+}
+
+
+def decode(instruction):
+    """Split an instruction word into (opcode, mode_1, mode_2, mode_3, operand_count)."""
+    opcode = instruction % 100
+    return (
+        opcode,
+        instruction // 100 % 10,
+        instruction // 1000 % 10,
+        instruction // 10000 % 10,
+        OPERAND_COUNTS.get(opcode, 0),
+    )
+
+
+OPCODE_NAMES = {
+    1: 'ADD',
+    2: 'MUL',
+    3: 'IN',
+    4: 'OUT',
+    5: 'JT',
+    6: 'JF',
+    7: 'LT',
+    8: 'EQ',
+    9: 'ARB',
+    99: 'HALT',
+}
+
+HALTED = 'halted'
+WAITING_FOR_INPUT = 'waiting for input'
+OUTPUT = 'output'
+BUDGET_EXHAUSTED = 'budget exhausted'
+
+
+class Tracer:
+    """Ring buffer holding the last `size` executed instructions as (ip, opcode, operands, result).
+
+    Attach it with `vm.tracer = Tracer()`; tick() and execute() then step
+    the program through the tracer. Without a tracer no tracing code runs.
+    `result` is the value written, the value output, the new ip of a jump or
+    the new relative base. The buffer is dumped to stderr if an instruction
+    raises, and every record is printed as it happens with `echo`.
+    """
+
+    def __init__(self, size=1024, echo=False):
+        self.size = size
+        self.records = [None] * size
+        self.position = 0
+        self.echo = echo
+
+    def fork(self):
+        """Empty tracer with the same settings, for a forked VM."""
+        return Tracer(self.size, self.echo)
+
+    def execute(self, vm, stop_on_output=False, max_instructions=None):
+        # tick() routes every instruction through step() while a tracer is attached.
+        return ReferenceEngine().execute(vm, stop_on_output, max_instructions)
+
+    def step(self, vm):
+        ip = vm.ip if vm.last_instruction_address is None else vm.last_instruction_address
+        try:
+            # Reading the operands faults just like the instruction itself.
+            opcode, mode_1, mode_2, mode_3, operand_count = vm.decode_instruction(ip)
+            operands = tuple(vm.read_memory(ip + i) for i in range(1, operand_count + 1))
+            if opcode in (1, 2, 7, 8):
+                target = self.address(vm, ip + 3, mode_3, operands[2])
+            elif opcode in (3, 4):
+                target = self.address(vm, ip + 1, mode_1, operands[0])
+            output = vm.read_memory(target) if opcode == 4 else None
+            vm.step()
+        except Exception:
+            self.dump()
+            raise
+        if vm.waiting_for_input:
+            return opcode
+        if opcode in (1, 2, 3, 7, 8):
+            result = vm.read_memory(target)
+        elif opcode in (5, 6):
+            result = vm.ip
+        elif opcode == 9:
+            result = vm.relative_base
+        else:
+            result = output
+        record = (ip, opcode, operands, result)
+        self.records[self.position % self.size] = record
+        self.position += 1
+        if self.echo:
+            print(self.format(record))
+        return opcode
+
+    @staticmethod
+    def address(vm, operand_address, mode, operand):
+        if mode == 1:
+            return operand_address
+        if mode == 2:
+            return operand + vm.relative_base
+        return operand
+
+    @staticmethod
+    def format(record):
+        ip, opcode, operands, result = record
+        operands = ', '.join(str(operand) for operand in operands)
+        return f'{ip:>8}: {OPCODE_NAMES.get(opcode, opcode):<4} {operands:<40} -> {result}'
+
+    def entries(self):
+        """Records from oldest to newest."""
+        if self.position <= self.size:
+            return self.records[:self.position]
+        start = self.position % self.size
+        return self.records[start:] + self.records[:start]
+
+    def dump(self, file=None):
+        for record in self.entries():
+            print(self.format(record), file=file or sys.stderr)
+
+
+class Engine(metaclass=abc.ABCMeta):
+    """Strategy executing the program of an IntCode VM.
+
+    Every VM owns one engine instance, engines keep the architectural state
+    (ip, relative base, memory, buffers, status flags) on the VM so they can
+    be swapped between two calls of execute(). Engines caching anything
+    derived from memory drop it in invalidate(), which IntCode.write_memory()
+    calls for every write.
+    """
+    name = None
+
+    @abc.abstractmethod
+    def execute(self, vm, stop_on_output=False, max_instructions=None):
+        """Run until the program halts, waits for input or, with `stop_on_output`, outputs.
+
+        Returns HALTED, WAITING_FOR_INPUT or OUTPUT, or BUDGET_EXHAUSTED
+        after exactly `max_instructions` instructions when that is given.
+        """
+
+    def invalidate(self, address):
+        pass
+
+    def fork(self):
+        return self.__class__()
+
+
+def run_ticks(vm, stop_on_output=False, max_instructions=None, before=None, after=None):
+    """Run `vm` one tick() at a time, returning a status like Engine.execute().
+
+    The loop of ReferenceEngine, also used by the profiler and the debugger.
+    `before(vm, ip)` is called before every instruction, a status it returns
+    stops the VM there. `after(vm, ip, opcode)` is called after every
+    instruction that ran, not after an input left waiting.
+    """
+    vm.running = True
+    count = 0
+    while True:
+        if count == max_instructions:
+            return BUDGET_EXHAUSTED
+        ip = vm.ip if vm.last_instruction_address is None else vm.last_instruction_address
+        if before is not None:
+            status = before(vm, ip)
+            if status is not None:
+                vm.running = False
+                return status
+        count += 1
+        opcode = vm.tick()
+        if vm.waiting_for_input:
+            vm.running = False
+            return WAITING_FOR_INPUT
+        if after is not None:
+            after(vm, ip, opcode)
+        if opcode == 99:
+            return HALTED
+        if stop_on_output and opcode == 4:
+            return OUTPUT
+
+
+class ReferenceEngine(Engine):
+    """Steps the program one instruction at a time through the handler methods of the VM."""
+    name = 'reference'
+
+    def execute(self, vm, stop_on_output=False, max_instructions=None):
+        return run_ticks(vm, stop_on_output, max_instructions)
+
+
+class FastEngine(Engine):
+    """Runs the program in a single fused loop until it halts, waits for input or outputs.
+
+    State is kept in locals and only written back to the VM when the loop
+    returns. Memory pages are read directly and the decode cache is kept up
+    to date by hand, the handler methods of the VM are not used.
+    """
+    name = 'fast'
+
+    def execute(self, vm, stop_on_output=False, max_instructions=None):
+        memory = vm.memory
+        get_page = memory.pages.get
+        write = memory.__setitem__
+        decoded = vm.decoded
+        input_buffer = vm.input_buffer
+        do_output = vm.do_output
+        ip = vm.ip if vm.last_instruction_address is None else vm.last_instruction_address
+        rb = vm.relative_base
+        count = 0
+        # Never equal to count, so no budget costs one comparison per instruction.
+        limit = -1 if max_instructions is None else max_instructions
+        vm.last_instruction_address = None
+        vm.running = True
+        try:
+            while True:
+                if count == limit:
+                    return BUDGET_EXHAUSTED
+                try:
+                    opcode, mode_1, mode_2, mode_3, _ = decoded[ip]
+                except KeyError:
+                    opcode, mode_1, mode_2, mode_3, _ = decoded[ip] = decode(memory[ip])
+                count += 1
+
+                if opcode == 99:
+                    vm.running = False
+                    vm.done = True
+                    return HALTED
+
+                # First parameter, every other opcode has one.
+                a = get_page((ip + 1) >> PAGE_BITS, ZERO_PAGE)[(ip + 1) & PAGE_MASK]
+                if mode_1 == 2:
+                    a += rb
+                if opcode == 3:
+                    if mode_1 == 1:
+                        a = ip + 1
+                    if not len(input_buffer):
+                        count -= 1
+                        vm.waiting_for_input = True
+                        vm.running = False
+                        return WAITING_FOR_INPUT
+                    write(a, input_buffer.pop())
+                    if a in decoded:
+                        del decoded[a]
+                    vm.waiting_for_input = False
+                    ip += 2
+                    continue
+                if mode_1 != 1:
+                    if a < 0:
+                        raise IndexError(f'Negative address {a}')
+                    a = get_page(a >> PAGE_BITS, ZERO_PAGE)[a & PAGE_MASK]
+                if opcode == 4:
+                    ip += 2
+                    do_output(a)
+                    if stop_on_output:
+                        return OUTPUT
+                    continue
+                if opcode == 9:
+                    rb += a
+                    ip += 2
+                    continue
+
+                b = get_page((ip + 2) >> PAGE_BITS, ZERO_PAGE)[(ip + 2) & PAGE_MASK]
+                if mode_2 != 1:
+                    if mode_2 == 2:
+                        b += rb
+                    if b < 0:
+                        raise IndexError(f'Negative address {b}')
+                    b = get_page(b >> PAGE_BITS, ZERO_PAGE)[b & PAGE_MASK]
+                if opcode == 5:
+                    ip = b if a else ip + 3
+                    continue
+                if opcode == 6:
+                    ip = ip + 3 if a else b
+                    continue
+
+                if mode_3 == 1:
+                    c = ip + 3
+                else:
+                    c = get_page((ip + 3) >> PAGE_BITS, ZERO_PAGE)[(ip + 3) & PAGE_MASK]
+                    if mode_3 == 2:
+                        c += rb
+                if opcode == 1:
+                    write(c, a + b)
+                elif opcode == 2:
+                    write(c, a * b)
+                elif opcode == 7:
+                    write(c, int(a < b))
+                elif opcode == 8:
+                    write(c, int(a == b))
+                else:
+                    raise ValueError(f'Unknown opcode {opcode} at address {ip}')
+                if c in decoded:
+                    del decoded[c]
+                ip += 4
+        finally:
+            vm.ip = ip
+            vm.relative_base = rb
+            vm.instruction_count += count
+
+
+ENGINES = {
+    ReferenceEngine.name: ReferenceEngine,
+    FastEngine.name: FastEngine,
+}
+# Engines living in other modules, registered when their module is imported.
+ENGINE_MODULES = {
+    'compiled': 'intcode_compiler',
+}
+DEFAULT_ENGINE = os.environ.get('INTCODE_ENGINE', FastEngine.name)
+
+
+def make_engine(engine=None):
+    """Engine instance for `engine`, a name, an Engine or None for DEFAULT_ENGINE."""
+    if isinstance(engine, Engine):
+        return engine
+    name = DEFAULT_ENGINE if engine is None else engine
+    if name not in ENGINES and name in ENGINE_MODULES:
+        importlib.import_module(ENGINE_MODULES[name])
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f'Unknown IntCode engine {name!r}, choose one of {sorted({*ENGINES, *ENGINE_MODULES})}') from None
+
+
+def configure_engine(argv=None):
+    """Set DEFAULT_ENGINE from an `--engine NAME` command line option; other arguments are left alone."""
+    global DEFAULT_ENGINE
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--engine', choices=sorted({*ENGINES, *ENGINE_MODULES}), default=DEFAULT_ENGINE)
+    args, _ = parser.parse_known_args(argv)
+    DEFAULT_ENGINE = args.engine
+    return DEFAULT_ENGINE
+
 
 class IntCode:
-    DEBUG = False
+    """Intcode VM; `engine` picks how execute() runs the program, see make_engine().
 
-    @classmethod
-    def dprint(cls, *args, **kwargs):
-        if cls.DEBUG:
-            print(*args, **kwargs)
+    MEMORY is the PagedMemory class holding the VM's memory, set it to
+    Int64PagedMemory for compact int64 pages.
+    """
+    DEBUG = False
+    MEMORY = PagedMemory
 
-    def __init__(self, memory, input_buffer: IO = None, output_buffer: IO = None):
+    def __init__(self, memory, input_buffer: IO = None, output_buffer: IO = None, engine=None):
         self.ip = 0
-        self.memory = memory[:] + [0] * 1024 * 1024
+        self.memory = self.MEMORY(memory)
         self.parameter_modes = []
         self.running = False
         self.opcodes = {
@@ -83,6 +647,31 @@ class IntCode:
         self.last_instruction_address = None
         self.done = False
         self.waiting_for_input = False
+        self.decoded = {}
+        self.instruction_count = 0
+        self.profiler = None
+        self.debugger = None
+        self.tracer = Tracer(echo=True) if self.DEBUG else None
+        self.engine = make_engine(engine)
+
+    def fork(self):
+        """Return a copy of this VM which shares memory pages with it until either one writes."""
+        child = copy.copy(self)
+        child.memory = self.memory.fork()
+        child.opcodes = {opcode: getattr(child, handler.__name__) for opcode, handler in self.opcodes.items()}
+        child.parameter_modes = self.parameter_modes[:]
+        child.input_buffer = self.input_buffer.copy()
+        child.output_buffer = self.output_buffer.copy()
+        child.decoded = dict(self.decoded)
+        child.engine = self.engine.fork()
+        # Each VM records into its own profiler and tracer and stops at its own breakpoints.
+        if self.debugger is not None:
+            child.debugger = self.debugger.fork()
+        if self.profiler is not None:
+            child.profiler = self.profiler.fork()
+        if self.tracer is not None:
+            child.tracer = self.tracer.fork()
+        return child
 
     def get_parameter_address(self):
         try:
@@ -96,7 +685,6 @@ class IntCode:
             address = self.read_memory(self.ip) + self.relative_base
         else:
             address = self.read_memory(self.ip)
-        self.dprint(f'GET PARAMETER ADDRESS: mode={parameter_mode}, memory_value={self.read_memory(self.ip)}, address={address}')
         self.ip += 1
         return address
 
@@ -106,29 +694,37 @@ class IntCode:
         self.relative_base += self.read_memory(parameter_address)
 
     def read_memory(self, address):
-        if address < 0:
-            return self.memory[0]
         return self.memory[address]
 
+    def write_memory(self, address, value):
+        self.memory[address] = value
+        if address in self.decoded:
+            del self.decoded[address]
+        self.engine.invalidate(address)
+
+    def decode_instruction(self, address):
+        try:
+            return self.decoded[address]
+        except KeyError:
+            instruction = self.decoded[address] = decode(self.read_memory(address))
+            return instruction
+
     def jump_if_true(self):
         self.ip += 1
         a = self.get_parameter_address()
         b = self.get_parameter_address()
-        if self.read_memory(a):
-            self.ip = self.read_memory(b)
-            self.dprint(f'JT(a={a}, b={b}) DO JUMP')
-        else:
-            self.dprint(f'JT(a={a}, b={b}) DON\'T JUMP')
+        # The target is read also when the jump is not taken, as in the fast engines.
+        condition, target = self.read_memory(a), self.read_memory(b)
+        if condition:
+            self.ip = target
 
     def jump_if_false(self):
         self.ip += 1
         a = self.get_parameter_address()
         b = self.get_parameter_address()
-        if not self.read_memory(a):
-            self.ip = self.read_memory(b)
-            self.dprint(f'JF(a={a}, b={b}) DO JUMP')
-        else:
-            self.dprint(f'JF(a={a}, b={b}) DON\'T JUMP')
+        condition, target = self.read_memory(a), self.read_memory(b)
+        if not condition:
+            self.ip = target
 
     def less_than(self):
         self.ip += 1
@@ -137,8 +733,7 @@ class IntCode:
             self.get_parameter_address(),
             self.get_parameter_address(),
         )
-        self.dprint(f'LT(a={a}, b={b}, c={c})')
-        self.memory[c] = int(self.read_memory(a) < self.read_memory(b))
+        self.write_memory(c, int(self.read_memory(a) < self.read_memory(b)))
 
     def equals(self):
         self.ip += 1
@@ -147,15 +742,14 @@ class IntCode:
             self.get_parameter_address(),
             self.get_parameter_address(),
         )
-        self.dprint(f'EQ(a={a}, b={b}, c={c})')
-        self.memory[c] = int(self.read_memory(a) == self.read_memory(b))
+        self.write_memory(c, int(self.read_memory(a) == self.read_memory(b)))
 
     def input(self):
         self.last_instruction_address = self.ip
         self.ip += 1
         inp = self.get_input()
         if inp is not None:
-            self.memory[self.get_parameter_address()] = inp
+            self.write_memory(self.get_parameter_address(), inp)
             self.last_instruction_address = None
             self.waiting_for_input = False
         else:
@@ -170,7 +764,6 @@ class IntCode:
         self.ip += 1
         output = self.read_memory(self.get_parameter_address())
         self.do_output(output)
-        self.dprint(f'OUTPUT: {output}')
 
     def do_output(self, output):
         self.output_buffer.add(output)
@@ -182,8 +775,7 @@ class IntCode:
             self.get_parameter_address(),
             self.get_parameter_address(),
         )
-        self.dprint(f'ADD(a={a}, b={b}, c={c})')
-        self.memory[c] = self.read_memory(a) + self.read_memory(b)
+        self.write_memory(c, self.read_memory(a) + self.read_memory(b))
 
     def mul(self):
         self.ip += 1
@@ -192,36 +784,128 @@ class IntCode:
             self.get_parameter_address(),
             self.get_parameter_address(),
         )
-        self.dprint(f'MUL(a={a}, b={b}, c={c})')
-        self.memory[c] = self.read_memory(a) * self.read_memory(b)
+        self.write_memory(c, self.read_memory(a) * self.read_memory(b))
 
     def halt(self):
         self.running = False
         self.done = True
 
     def run_program(self, noun, verb):
-        self.memory[1] = noun
-        self.memory[2] = verb
+        self.write_memory(1, noun)
+        self.write_memory(2, verb)
         return self.run()
 
-    def run(self, inputs=None):
+    def run(self, inputs=None, max_instructions=None):
+        """Run until the program halts or waits for input; returns and clears the outputs.
+
+        With `max_instructions` it also returns once that many instructions
+        ran, with neither `done` nor `waiting_for_input` set; run() again to
+        resume.
+        """
         if inputs is not None:
             self.input_buffer.extend(inputs)
-        self.running = True
-        while self.running:
-            self.tick()
-        out = tuple(self.output_buffer)
-        self.output_buffer.clear()
-        return out
+        self.execute(max_instructions=max_instructions)
+        return tuple(self.output_buffer.drain())
+
+    def execute(self, stop_on_output=False, max_instructions=None):
+        """Run the program with the VM's engine until it halts or waits for input.
+
+        With `stop_on_output` it also returns after each output, with
+        `max_instructions` after at most that many instructions. Returns
+        HALTED, WAITING_FOR_INPUT, OUTPUT or BUDGET_EXHAUSTED; the VM
+        resumes where it stopped on the next call. With a profiler or tracer
+        attached, that steps the program instead. A debugger runs it while
+        it has breakpoints or watchpoints set.
+        """
+        if self.debugger is not None and self.debugger.active():
+            return self.debugger.execute(self, stop_on_output, max_instructions)
+        if self.profiler is not None:
+            return self.profiler.execute(self, stop_on_output, max_instructions)
+        if self.tracer is not None:
+            return self.tracer.execute(self, stop_on_output, max_instructions)
+        return self.engine.execute(self, stop_on_output, max_instructions)
+
+    async def run_async(self, inputs=None):
+        """Run the program as an asyncio task until it halts.
+
+        The input buffer has to be an AsyncIO channel, the task awaits it
+        whenever the program blocks on input. Outputs are left in the output
+        buffer, which is usually another VM's input channel.
+        """
+        if inputs is not None:
+            self.input_buffer.extend(inputs)
+        while self.execute() == WAITING_FOR_INPUT:
+            await self.input_buffer.wait()
+
+    def outputs(self):
+        """Generator yielding each output of the program as soon as it is produced.
+
+        When the program needs input and none is queued the generator yields
+        WAITING_FOR_INPUT and stays suspended at the input instruction. Any
+        value passed to send() is queued as input.
+        """
+        while True:
+            status = self.execute(stop_on_output=True)
+            while len(self.output_buffer):
+                value = yield self.output_buffer.pop()
+                if value is not None:
+                    self.input_buffer.add(value)
+            if status == HALTED:
+                return
+            if status == WAITING_FOR_INPUT and not len(self.input_buffer):
+                value = yield WAITING_FOR_INPUT
+                if value is not None:
+                    self.input_buffer.add(value)
+
+    def send(self, value=None):
+        """Queue `value` as input and run until the next output, which is returned.
+
+        Returns WAITING_FOR_INPUT if the program needs input first and None
+        once it has halted.
+        """
+        if value is not None:
+            self.input_buffer.add(value)
+        if not len(self.output_buffer):
+            status = self.execute(stop_on_output=True)
+            if status == WAITING_FOR_INPUT:
+                return WAITING_FOR_INPUT
+            if status == HALTED and not len(self.output_buffer):
+                return None
+        return self.output_buffer.pop()
+
+    def run_until(self, predicate=None, on_output=None, on_input=None):
+        """Run the program, handing control back only when `predicate(vm)` is true.
+
+        The predicate is checked before running and after every output.
+        Outputs are passed to `on_output(value)` as they are produced instead
+        of piling up in the output buffer. When the program needs input and
+        none is queued, `on_input()` is asked for the next value. Returns
+        the status execute() stopped with: OUTPUT when the predicate fired,
+        WAITING_FOR_INPUT if there was no `on_input` or it returned None,
+        HALTED, or None if the predicate held before anything ran.
+        """
+        stop_on_output = predicate is not None or on_output is not None
+        status = None
+        while predicate is None or not predicate(self):
+            status = self.execute(stop_on_output)
+            if status == OUTPUT:
+                if on_output is not None:
+                    for value in self.output_buffer.drain():
+                        on_output(value)
+                continue
+            if status == WAITING_FOR_INPUT and on_input is not None:
+                value = on_input()
+                if value is not None:
+                    self.input_buffer.add(value)
+                    continue
+            break
+        return status
 
     def run_until_out(self, inputs=None, n_out=1):
         if inputs is not None:
             self.input_buffer.extend(inputs)
-        while len(self.output_buffer) < n_out:
-            self.tick()
-            if self.waiting_for_input:
-                break
-        if self.waiting_for_input:
+        self.run_until(lambda vm: len(vm.output_buffer) >= n_out)
+        if len(self.output_buffer) < n_out:
             out = None
         else:
             out = tuple(self.output_buffer) if n_out > 1 else self.output_buffer.pop()
@@ -229,10 +913,24 @@ class IntCode:
         return out
 
     def tick(self):
+        """Execute one instruction; returns its opcode."""
+        if self.tracer is not None:
+            return self.tracer.step(self)
+        return self.step()
+
+    def step(self):
         if self.last_instruction_address is not None:
             self.ip = self.last_instruction_address
-        self.dprint(f'INSTRUCTION POINTER: {self.ip}')
-        opcode = self.read_memory(self.ip) % 100
-        self.parameter_modes += [int(d) for d in str(self.read_memory(self.ip))[:-2]]
-        self.dprint(f'OPCODE: {opcode} ({self.opcodes.get(opcode).__name__}), PRM_MODES={self.parameter_modes!r}')
-        self.opcodes.get(opcode)()
+        ip = self.ip
+        opcode, mode_1, mode_2, mode_3, operand_count = self.decode_instruction(ip)
+        self.parameter_modes = [mode_3, mode_2, mode_1][3 - operand_count:]
+        try:
+            self.opcodes.get(opcode)()
+        except Exception:
+            # A faulting instruction leaves ip at its start, like in the fast engines.
+            self.ip = ip
+            raise
+        # An input finding no value has not run yet, like in the fast engines.
+        if not self.waiting_for_input:
+            self.instruction_count += 1
+        return opcode
@@ -0,0 +1,261 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from intcode import HALTED, OPERAND_COUNTS, WAITING_FOR_INPUT, IntCode, decode
+from intcode_parallel import BatchResult
+
+RUNNING = 'running'
+FALLBACK = 'fallback'
+# Products at least this large (in float arithmetic) may not fit int64.
+MUL_LIMIT = float(1 << 62)
+MAX_COLUMNS = 1 << 16
+# Size limit of the memory array of all lanes together, which lowers MAX_COLUMNS for large batches.
+MAX_MEMORY_BYTES = 1 << 28
+
+
+class LockstepBatch:
+    """N copies of one program executed instruction by instruction with NumPy.
+
+    Memory is an (N, columns) int64 array with one row per lane and every
+    lane has its own relative base, inputs and outputs. Lanes are grouped by
+    instruction pointer, and a group executes one instruction for all its
+    lanes at once with vectorised gathers and scatters. Lanes whose
+    instruction word differs or whose jumps go elsewhere are split into
+    separate groups, which merge again when they reach the same address.
+    The group with the lowest address runs first, so lanes that skipped
+    ahead wait for the others.
+
+    Lanes leaving what int64 arrays can do are handed to IntCode: lanes
+    whose values overflow int64 or that address negative or far away
+    memory, jump to a negative address or hit an unknown opcode. Memory is
+    far away at MAX_COLUMNS, or sooner when the lanes' memory would take
+    more than MAX_MEMORY_BYTES. Fallback lanes are rerun from the start
+    when the results are collected.
+    """
+
+    def __init__(self, program, inputs_list, patches):
+        if np is None:
+            raise ImportError('LockstepBatch needs NumPy, use intcode_parallel.run_many() without it')
+        self.program = program
+        self.inputs_list = [tuple(inputs) for inputs in inputs_list]
+        self.patches = patches
+        n = len(inputs_list)
+        self.max_columns = min(MAX_COLUMNS, MAX_MEMORY_BYTES // (8 * max(n, 1)))
+        self.status = [RUNNING] * n
+        self.outputs = [[] for _ in range(n)]
+        self.relative_base = np.zeros(n, np.int64)
+        self.instructions = np.zeros(n, np.int64)
+        self.steps = 0
+
+        longest = max((len(inputs) for inputs in self.inputs_list), default=0)
+        self.inputs = np.zeros((n, max(longest, 1)), np.int64)
+        self.input_count = np.zeros(n, np.int64)
+        self.input_position = np.zeros(n, np.int64)
+        try:
+            if len(program) > self.max_columns:
+                raise OverflowError(len(program))
+            self.memory = np.zeros((n, max(len(program), 1)), np.int64)
+            self.memory[:, :len(program)] = np.array(program, np.int64)
+        except OverflowError:
+            self.memory = np.zeros((n, 1), np.int64)
+            self.status = [FALLBACK] * n
+            self.groups = {}
+            return
+        for lane, (inputs, patch) in enumerate(zip(self.inputs_list, patches)):
+            try:
+                self.inputs[lane, :len(inputs)] = inputs
+                self.input_count[lane] = len(inputs)
+                for address, value in patch.items():
+                    if address < 0 or not self.grow(address):
+                        raise OverflowError(address)
+                    self.memory[lane, address] = value
+            except OverflowError:
+                self.status[lane] = FALLBACK
+        lanes = np.array([lane for lane in range(n) if self.status[lane] == RUNNING], np.int64)
+        self.groups = {0: lanes} if len(lanes) else {}
+
+    def grow(self, address):
+        """Make room for `address` in every lane; False if that takes more than `max_columns`."""
+        columns = self.memory.shape[1]
+        if address < columns:
+            return True
+        if address >= self.max_columns:
+            return False
+        memory = np.zeros((self.memory.shape[0], min(max(address + 1, 2 * columns), self.max_columns)), np.int64)
+        memory[:, :columns] = self.memory
+        self.memory = memory
+        return True
+
+    def add_group(self, ip, lanes):
+        if not len(lanes):
+            return
+        if ip in self.groups:
+            self.groups[ip] = np.concatenate((self.groups[ip], lanes))
+        else:
+            self.groups[ip] = lanes
+
+    def fall_back(self, lanes):
+        for lane in lanes.tolist():
+            self.status[lane] = FALLBACK
+
+    def run(self):
+        """Run until every lane has halted, waits for input or was handed to IntCode."""
+        while self.groups:
+            ip = min(self.groups)
+            lanes = self.groups.pop(ip)
+            if ip < 0 or not self.grow(ip):
+                self.fall_back(lanes)
+                continue
+            words = self.memory[lanes, ip]
+            for word in np.unique(words).tolist():
+                self.step(ip, word, lanes[words == word] if len(words) > 1 else lanes)
+        return self
+
+    def parameter(self, lanes, ip, offset, mode):
+        """(address, valid) of a parameter for each lane; immediates use the operand's own address."""
+        if mode == 1:
+            return np.full(len(lanes), ip + offset, np.int64), np.ones(len(lanes), bool)
+        address = self.memory[lanes, ip + offset]
+        if mode == 2:
+            with np.errstate(over='ignore'):
+                address = address + self.relative_base[lanes]
+        return address, (address >= 0) & (address < self.max_columns)
+
+    def read(self, lanes, address):
+        columns = self.memory.shape[1]
+        inside = address < columns
+        values = self.memory[lanes, np.where(inside, address, 0)]
+        return np.where(inside, values, 0)
+
+    def step(self, ip, word, lanes):
+        opcode, mode_1, mode_2, mode_3, operand_count = decode(word)
+        if opcode == 99:
+            for lane in lanes.tolist():
+                self.status[lane] = HALTED
+            return
+        if opcode not in OPERAND_COUNTS:
+            self.fall_back(lanes)
+            return
+        if not self.grow(ip + operand_count):
+            self.fall_back(lanes)
+            return
+        modes = (mode_1, mode_2, mode_3)[:operand_count]
+        parameters = [self.parameter(lanes, ip, i, mode) for i, mode in enumerate(modes, 1)]
+        valid = np.logical_and.reduce([ok for _, ok in parameters])
+        if not valid.all():
+            self.fall_back(lanes[~valid])
+            return self.step(ip, word, lanes[valid]) if valid.any() else None
+        addresses = [address for address, _ in parameters]
+
+        if opcode == 3:
+            has_input = self.input_position[lanes] < self.input_count[lanes]
+            for lane in lanes[~has_input].tolist():
+                self.status[lane] = WAITING_FOR_INPUT
+            lanes = lanes[has_input]
+            target = addresses[0][has_input]
+            positions = self.input_position[lanes]
+            self.grow(int(target.max(initial=0)))
+            self.memory[lanes, target] = self.inputs[lanes, positions]
+            self.input_position[lanes] = positions + 1
+            self.count(lanes)
+            self.add_group(ip + 2, lanes)
+            return
+
+        a = self.read(lanes, addresses[0])
+        if opcode == 4:
+            for lane, value in zip(lanes.tolist(), a.tolist()):
+                self.outputs[lane].append(value)
+            self.count(lanes)
+            self.add_group(ip + 2, lanes)
+            return
+        if opcode == 9:
+            with np.errstate(over='ignore'):
+                relative_base = self.relative_base[lanes] + a
+            overflow = ((self.relative_base[lanes] ^ relative_base) & (a ^ relative_base)) < 0
+            if overflow.any():
+                self.fall_back(lanes[overflow])
+                lanes, relative_base = lanes[~overflow], relative_base[~overflow]
+            self.relative_base[lanes] = relative_base
+            self.count(lanes)
+            self.add_group(ip + 2, lanes)
+            return
+
+        b = self.read(lanes, addresses[1])
+        if opcode in (5, 6):
+            taken = (a != 0) if opcode == 5 else (a == 0)
+            self.count(lanes)
+            self.add_group(ip + 3, lanes[~taken])
+            targets = b[taken]
+            for target in np.unique(targets).tolist():
+                self.add_group(target, lanes[taken][targets == target])
+            return
+
+        with np.errstate(over='ignore'):
+            if opcode == 1:
+                result = a + b
+                overflow = ((a ^ result) & (b ^ result)) < 0
+            elif opcode == 2:
+                result = a * b
+                overflow = np.abs(a.astype(np.float64)) * np.abs(b.astype(np.float64)) >= MUL_LIMIT
+            elif opcode == 7:
+                result = (a < b).astype(np.int64)
+                overflow = None
+            else:
+                result = (a == b).astype(np.int64)
+                overflow = None
+        target = addresses[2]
+        if overflow is not None and overflow.any():
+            self.fall_back(lanes[overflow])
+            lanes, result, target = lanes[~overflow], result[~overflow], target[~overflow]
+        self.grow(int(target.max(initial=0)))
+        self.memory[lanes, target] = result
+        self.count(lanes)
+        self.add_group(ip + 4, lanes)
+
+    def count(self, lanes):
+        self.instructions[lanes] += 1
+        self.steps += 1
+
+    def results(self, peek=()):
+        """One BatchResult per lane; lanes handed to IntCode are run now."""
+        for address in peek:
+            if address < 0:
+                # NumPy would read the last columns instead.
+                raise IndexError(f'Negative address {address}')
+        results = []
+        columns = self.memory.shape[1]
+        for lane, status in enumerate(self.status):
+            if status == FALLBACK:
+                vm = IntCode(self.program)
+                for address, value in self.patches[lane].items():
+                    vm.write_memory(address, value)
+                outputs = vm.run(self.inputs_list[lane])
+                memory = tuple(vm.memory[address] for address in peek)
+            else:
+                outputs = tuple(self.outputs[lane])
+                memory = tuple(int(self.memory[lane, address]) if address < columns else 0 for address in peek)
+            results.append(BatchResult(lane, outputs, memory, False))
+        return results
+
+
+def run_lockstep(program, inputs_list=None, patches=None, peek=()):
+    """Run copies of `program` in lockstep with NumPy, see LockstepBatch.
+
+    Takes the same runs as intcode_parallel.run_many() and returns the same
+    BatchResults, sorted by run index. Pays off when most runs take the same
+    path through the program, like the noun/verb sweep of day 2 or the phase
+    permutations of day 7. Every instruction costs tens of microseconds of
+    NumPy overhead no matter how many lanes share it, so a handful of long
+    runs is much faster with separate IntCode VMs.
+    """
+    if inputs_list is None and patches is None:
+        raise ValueError('inputs_list or patches must describe the runs')
+    if inputs_list is None:
+        inputs_list = [()] * len(patches)
+    if patches is None:
+        patches = [{}] * len(inputs_list)
+    if len(inputs_list) != len(patches):
+        raise ValueError('inputs_list and patches must describe the same number of runs')
+    return LockstepBatch(program, inputs_list, patches).run().results(peek)
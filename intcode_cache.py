@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from intcode import IntCode
+
+DEFAULT_DIRECTORY = '.intcode_cache'
+
+
+class ResultCache:
+    """Content addressed on-disk cache for results of deterministic Intcode runs.
+
+    Entries are JSON files named by a SHA-256 of the program image and
+    everything else the run depends on. They are written to a temporary file
+    and renamed into place, so several processes can share one directory;
+    a reader sees either a complete entry or none. Hits refresh the file's
+    mtime and the oldest entries are removed once there are more than
+    `max_entries`. Other processes add entries too, so the directory is
+    recounted every tenth of `max_entries` writes.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_entries=10000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+        self.entries = sum(1 for _ in self.scan())
+
+    @classmethod
+    def from_environment(cls, variable='INTCODE_CACHE'):
+        """Cache in the directory named by $INTCODE_CACHE, or None when it is not set."""
+        directory = os.environ.get(variable)
+        return cls(directory) if directory else None
+
+    def __getstate__(self):
+        # Pool workers get their own counters, see run_many().
+        return {'directory': self.directory, 'max_entries': self.max_entries}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'], state['max_entries'])
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @staticmethod
+    def key(program, *parts):
+        digest = hashlib.sha256(','.join(map(str, program)).encode())
+        for part in parts:
+            digest.update(b'|' + json.dumps(part, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def scan(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json'):
+                    yield entry
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self.path(key)
+        # Overwriting an entry, e.g. one another process added meanwhile, does not add one.
+        new = not os.path.exists(path)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(value, f)
+        os.replace(temporary, path)
+        self.entries += new
+        self.writes += 1
+        if self.entries > self.max_entries or self.writes % max(self.max_entries // 10, 1) == 0:
+            self.evict()
+
+    def evict(self):
+        """Recount the entries; if there are too many, keep the most recently used 90% of `max_entries`."""
+        entries = []
+        for entry in self.scan():
+            try:
+                entries.append((entry.stat().st_mtime_ns, entry.path))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        excess = len(entries) - self.max_entries * 9 // 10 if len(entries) > self.max_entries else 0
+        for _, path in entries[:max(excess, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.entries = len(entries) - max(excess, 0)
+
+    def clear(self):
+        for entry in self.scan():
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        self.entries = 0
+
+
+def cached_run(program, inputs=(), cache=None):
+    """IntCode(program).run(inputs), answered from `cache` when the same run was cached before."""
+    if cache is None:
+        return IntCode(program).run(inputs)
+    key = cache.key(program, list(inputs))
+    outputs = cache.get(key)
+    if outputs is None:
+        outputs = IntCode(program).run(inputs)
+        cache.put(key, list(outputs))
+    return tuple(outputs)
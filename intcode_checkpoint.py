@@ -0,0 +1,127 @@
+import struct
+from array import array
+
+from intcode import DequeIO, IntCode
+
+MAGIC = b'ICK1'
+FULL, DELTA = 0, 1
+HEADER = struct.Struct('<4sBqqqqB')
+COUNT = struct.Struct('<I')
+ESCAPE = struct.Struct('<II')
+PAGE_INDEX = struct.Struct('<q')
+DONE, WAITING_FOR_INPUT, RUNNING = 1, 2, 4
+
+
+def pack_values(values):
+    """Pack ints as int64; values that do not fit are stored as zero plus an escape entry."""
+    try:
+        packed = array('q', values)
+        escapes = []
+    except OverflowError:
+        packed = array('q')
+        escapes = []
+        for i, value in enumerate(values):
+            if -(1 << 63) <= value < (1 << 63):
+                packed.append(value)
+            else:
+                packed.append(0)
+                escapes.append((i, value.to_bytes((value.bit_length() + 8) // 8, 'little', signed=True)))
+    parts = [COUNT.pack(len(packed)), packed.tobytes(), COUNT.pack(len(escapes))]
+    for i, raw in escapes:
+        parts += [ESCAPE.pack(i, len(raw)), raw]
+    return b''.join(parts)
+
+
+def unpack_values(data, offset):
+    """Inverse of pack_values(); returns (values, new offset)."""
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    values = array('q')
+    values.frombytes(data[offset:offset + 8 * count])
+    values = values.tolist()
+    offset += 8 * count
+    (n_escapes,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    for _ in range(n_escapes):
+        i, length = ESCAPE.unpack_from(data, offset)
+        offset += ESCAPE.size
+        values[i] = int.from_bytes(data[offset:offset + length], 'little', signed=True)
+        offset += length
+    return values, offset
+
+
+class Checkpointer:
+    """Writes checkpoints of one IntCode VM into an append-only file.
+
+    The first checkpoint holds every memory page, later ones only the pages
+    written since the previous checkpoint. After each checkpoint all pages
+    of the VM are marked shared, so the next write to a page replaces it
+    with a copy (see PagedMemory.fork()) and dirty pages are simply those
+    that are no longer the object recorded in the last checkpoint.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.vm = None
+        self.pages = None
+
+    def save(self, vm):
+        pages = vm.memory.pages
+        if vm is self.vm:
+            kind, mode = DELTA, 'ab'
+            dirty = [index for index, page in pages.items() if self.pages.get(index) is not page]
+        else:
+            kind, mode = FULL, 'wb'
+            dirty = list(pages)
+        flags = (DONE * vm.done) | (WAITING_FOR_INPUT * vm.waiting_for_input) | (RUNNING * vm.running)
+        last = -1 if vm.last_instruction_address is None else vm.last_instruction_address
+        parts = [
+            HEADER.pack(MAGIC, kind, vm.ip, vm.relative_base, last, vm.instruction_count, flags),
+            pack_values(list(vm.input_buffer)),
+            pack_values(list(vm.output_buffer)),
+            COUNT.pack(len(dirty)),
+        ]
+        for index in dirty:
+            parts += [PAGE_INDEX.pack(index), pack_values(pages[index])]
+        with open(self.path, mode) as f:
+            f.write(b''.join(parts))
+
+        self.vm = vm
+        self.pages = dict(pages)
+        vm.memory.owned.clear()
+        return len(dirty)
+
+
+def restore(path, cls=IntCode):
+    """Rebuild the VM from the last checkpoint in `path` as an instance of `cls`."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    vm = cls([])
+    offset = 0
+    while offset < len(data):
+        magic, kind, ip, relative_base, last, instruction_count, flags = HEADER.unpack_from(data, offset)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an IntCode checkpoint file (offset {offset})')
+        offset += HEADER.size
+        if kind == FULL:
+            vm.memory = vm.MEMORY()
+        vm.ip = ip
+        vm.relative_base = relative_base
+        vm.last_instruction_address = None if last == -1 else last
+        vm.instruction_count = instruction_count
+        vm.done = bool(flags & DONE)
+        vm.waiting_for_input = bool(flags & WAITING_FOR_INPUT)
+        vm.running = bool(flags & RUNNING)
+        input_values, offset = unpack_values(data, offset)
+        output_values, offset = unpack_values(data, offset)
+        vm.input_buffer = DequeIO(input_values)
+        vm.output_buffer = DequeIO(output_values)
+        (n_pages,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for _ in range(n_pages):
+            (index,) = PAGE_INDEX.unpack_from(data, offset)
+            page, offset = unpack_values(data, offset + PAGE_INDEX.size)
+            vm.memory.pages[index] = vm.memory.make_page(page)
+            vm.memory.owned.add(index)
+    vm.decoded.clear()
+    return vm
@@ -0,0 +1,429 @@
+import operator
+from collections import Counter
+
+from intcode import (
+    HALTED,
+    OPCODE_NAMES,
+    OPERAND_COUNTS,
+    OUTPUT,
+    PAGE_BITS,
+    PAGE_MASK,
+    WAITING_FOR_INPUT,
+    ZERO_PAGE,
+    ENGINES,
+    Engine,
+    ReferenceEngine,
+    decode,
+)
+
+BLOCK_TERMINATORS = (3, 4, 99)
+# Returned by a block as the address it wrote to code when it stopped before an instruction touching a
+# negative address, which is never code.
+FAULT = -1
+OPERATIONS = {
+    1: ('{a} + {b}', operator.add),
+    2: ('{a} * {b}', operator.mul),
+    7: ('int({a} < {b})', lambda a, b: int(a < b)),
+    8: ('int({a} == {b})', lambda a, b: int(a == b)),
+}
+
+
+def read_expression(mode, word):
+    """Python expression reading a parameter, folded as far as the operand word allows.
+
+    `word` is the operand word, or the source of an expression reading it
+    when the operand is only known at run time.
+    """
+    if mode == 1:
+        return word if isinstance(word, str) else repr(word)
+    if mode == 2:
+        return f'get((rb + {word}) >> {PAGE_BITS}, Z)[(rb + {word}) & {PAGE_MASK}]'
+    if isinstance(word, str):
+        return f'get(({word}) >> {PAGE_BITS}, Z)[({word}) & {PAGE_MASK}]'
+    return f'get({word >> PAGE_BITS}, Z)[{word & PAGE_MASK}]'
+
+
+def first_exit(kind, a, b):
+    """Smallest t >= 0 for which `a + b * t` fails the loop condition `kind`, None if it never does.
+
+    `kind` is 'lt', 'ge', 'eq' or 'ne': the loop goes on while the value is
+    below, at or above, equal to or different from zero.
+    """
+    if kind == 'lt':
+        if a >= 0:
+            return 0
+        return None if b <= 0 else (-a + b - 1) // b
+    if kind == 'ge':
+        if a < 0:
+            return 0
+        return None if b >= 0 else a // -b + 1
+    if kind == 'eq':
+        if a != 0:
+            return 0
+        return None if b == 0 else 1
+    if a == 0:
+        return 0
+    if b == 0 or -a % b or -a // b < 0:
+        return None
+    return -a // b
+
+
+class CountedLoop:
+    """Block jumping back to its own start whose body only adds constants to cells and compares.
+
+    Such a loop is an induction: every cell it adds to grows by the same
+    amount per iteration and every comparison is between values linear in
+    the iteration number, so the iteration in which the jump falls through
+    can be solved for. Called like a block, it writes the state after that
+    many iterations, or as many as the budget allows, in one go. Whenever
+    that does not work out (the loop never ends, it writes code, a cell
+    both counted and compared into, a comparison of a flag) it runs
+    `block`, the plain compiled block, once instead. A loop that never got
+    solved in GIVE_UP_AFTER attempts is replaced by `block` for good.
+
+    `operations` are ('add', cell, constant) and ('compare', opcode, x, y,
+    cell) in body order and `jump` is (opcode, cell), where cells and
+    operands are (mode, operand word) pairs.
+    """
+    GIVE_UP_AFTER = 8
+
+    def __init__(self, engine, block, start, end, length, operations, jump):
+        self.engine = engine
+        self.block = block
+        self.start = start
+        self.end = end
+        self.length = length
+        self.operations = operations
+        self.jump = jump
+        self.solved = 0
+        self.attempts = 0
+
+    def __call__(self, rb, budget=None):
+        iterations = self.fast_forward(rb, budget)
+        self.attempts += 1
+        if iterations is None:
+            if not self.solved and self.attempts >= self.GIVE_UP_AFTER:
+                self.engine.blocks[self.start] = self.block
+            return self.block(rb, budget)
+        self.solved += 1
+        n, exited = iterations
+        return (self.end if exited else self.start), rb, n * self.length, None
+
+    def fast_forward(self, rb, budget):
+        """Apply the loop's iterations in closed form; returns (iterations, exited) or None."""
+        memory = self.engine.memory
+        steps = {}
+        flags = set()
+        for operation in self.operations:
+            if operation[0] == 'add':
+                address = operation[1][1] + (rb if operation[1][0] == 2 else 0)
+                steps[address] = steps.get(address, 0) + operation[2]
+            else:
+                flags.add(operation[4][1] + (rb if operation[4][0] == 2 else 0))
+        code = self.engine.code
+        if flags & steps.keys() or any(address < 0 or address in code for address in (*steps, *flags)):
+            return None
+
+        # Value of an operand in iteration t as a + b * t.
+        partial = dict.fromkeys(steps, 0)
+        compared = {}
+        def linear(mode, word):
+            if mode == 1:
+                return word, 0
+            address = word + (rb if mode == 2 else 0)
+            if address < 0 or address in flags:
+                raise LookupError(address)
+            if address in steps:
+                return memory[address] + partial[address], steps[address]
+            return memory[address], 0
+
+        try:
+            for operation in self.operations:
+                if operation[0] == 'add':
+                    address = operation[1][1] + (rb if operation[1][0] == 2 else 0)
+                    partial[address] += operation[2]
+                else:
+                    _, opcode, x, y, (mode, word) = operation
+                    (a_x, b_x), (a_y, b_y) = linear(*x), linear(*y)
+                    compared[word + (rb if mode == 2 else 0)] = (opcode, a_x - a_y, b_x - b_y)
+            opcode, (mode, word) = self.jump
+            address = word + (rb if mode == 2 else 0)
+            if mode != 1 and address in compared:
+                comparison, a, b = compared[address]
+                # LT sets the flag while a + b * t < 0, EQ while it is 0.
+                kind = ('lt', 'ge') if comparison == 7 else ('eq', 'ne')
+            else:
+                a, b = linear(mode, word)
+                kind = ('ne', 'eq')
+        except LookupError:
+            return None
+        last = first_exit(kind[opcode == 6], a, b)
+        if last is None:
+            return None
+        n = last + 1
+        if budget is not None:
+            n = min(n, budget // self.length)
+        if n < 2:
+            return None
+
+        t = n - 1
+        for address, step in steps.items():
+            memory[address] = memory[address] + step * n
+        for address, (comparison, a, b) in compared.items():
+            value = a + b * t
+            memory[address] = int(value < 0 if comparison == 7 else value == 0)
+        return n, n == last + 1
+
+
+def fault_condition(operands):
+    """Python condition true when one of the (mode, word) operands addresses negative memory.
+
+    'True' when a constant address is negative already, None when no address can be.
+    """
+    conditions = []
+    offsets = []
+    for mode, word in operands:
+        if mode == 1:
+            continue
+        if isinstance(word, str):
+            conditions.append(f'rb + ({word}) < 0' if mode == 2 else f'({word}) < 0')
+        elif mode == 2:
+            offsets.append(word)
+        elif word < 0:
+            return 'True'
+    if offsets:
+        conditions.insert(0, f'rb < {-min(offsets)}')
+    return ' or '.join(conditions) or None
+
+
+def write_expression(mode, word, address):
+    if mode == 1:
+        return repr(address)
+    if mode == 2:
+        return f'rb + {word}'
+    return word if isinstance(word, str) else repr(word)
+
+
+class CompiledEngine(Engine):
+    """Engine which compiles basic blocks of the program into Python functions.
+
+    A block runs from its start address up to and including the next jump, or
+    up to the next I/O or halt instruction, which are executed by the driver
+    loop in execute(). Every memory word a block was compiled from is recorded
+    in `code`; a write to one of them ends the block early and throws away all
+    blocks built from that word. Blocks are bound to the memory of one VM and
+    are dropped when the VM's memory is replaced.
+
+    A block jumping back to its own start that only counts and compares is
+    wrapped in a CountedLoop, which runs all its iterations at once.
+
+    Programs often pass pointers by rewriting the operand words of their own
+    instructions. An operand word written more than VOLATILE_AFTER times is
+    added to `volatile`; blocks compiled from then on read it from memory
+    when they run instead of folding it in, so writing it no longer costs a
+    recompile.
+    """
+    name = 'compiled'
+    MAX_BLOCK_LENGTH = 64
+    VOLATILE_AFTER = 2
+
+    def __init__(self):
+        self.memory = None
+        self.blocks = {}
+        self.block_ends = {}
+        self.code = {}
+        self.rewrites = Counter()
+        self.volatile = set()
+
+    def invalidate(self, address):
+        starts = self.code.pop(address, ())
+        if starts:
+            self.rewrites[address] += 1
+            if self.rewrites[address] > self.VOLATILE_AFTER:
+                self.volatile.add(address)
+        for start in starts:
+            del self.blocks[start]
+            for covered in range(start, self.block_ends.pop(start)):
+                starts = self.code.get(covered)
+                if starts is not None:
+                    starts.discard(start)
+                    if not starts:
+                        del self.code[covered]
+
+    def register(self, start, end, block, runtime=()):
+        """Record `block` as compiled from the words in [start, end) except those read at run time."""
+        self.blocks[start] = block
+        self.block_ends[start] = end
+        for address in range(start, end):
+            if address not in runtime:
+                self.code.setdefault(address, set()).add(start)
+        return block
+
+    def compile_block(self, memory, start):
+        """Compile the block at `start`; I/O, halt and unknown opcodes are returned decoded."""
+        instruction = decode(memory[start])
+        if instruction[0] in BLOCK_TERMINATORS or instruction[0] not in OPERAND_COUNTS:
+            return self.register(start, start + 1, instruction)
+
+        lines = []
+        runtime = set()
+        body = []
+        ip = start
+        n = 0
+        while n < self.MAX_BLOCK_LENGTH:
+            opcode, mode_1, mode_2, mode_3, operand_count = decode(memory[ip])
+            if opcode in BLOCK_TERMINATORS or opcode not in OPERAND_COUNTS:
+                break
+            words = []
+            for address in range(ip + 1, ip + 1 + operand_count):
+                if address in self.volatile:
+                    runtime.add(address)
+                    words.append(read_expression(0, address))
+                else:
+                    words.append(memory[address])
+            n += 1
+            next_ip = ip + 1 + operand_count
+            body.append((opcode, (mode_1, mode_2, mode_3), words))
+            lines.append(f'    # {ip}: {OPCODE_NAMES[opcode]} {words}')
+            condition = fault_condition(zip((mode_1, mode_2, mode_3), words))
+            if condition == 'True':
+                lines.append(f'    return {ip}, rb, {n - 1}, {FAULT}')
+                ip = next_ip
+                break
+            if condition is not None:
+                lines.append(f'    if {condition}:')
+                lines.append(f'        return {ip}, rb, {n - 1}, {FAULT}')
+            a = read_expression(mode_1, words[0])
+            if opcode == 9:
+                lines.append(f'    rb += {a}')
+                ip = next_ip
+                continue
+            b = read_expression(mode_2, words[1])
+            if opcode in (5, 6):
+                condition = a if opcode == 5 else f'not {a}'
+                lines.append(f'    if {condition}:')
+                lines.append(f'        return {b}, rb, {n}, None')
+                ip = next_ip
+                break
+            expression, operation = OPERATIONS[opcode]
+            if mode_1 == mode_2 == 1 and not isinstance(words[0], str) and not isinstance(words[1], str):
+                value = repr(operation(words[0], words[1]))
+            else:
+                value = expression.format(a=a, b=b)
+            lines.append(f'    c = {write_expression(mode_3, words[2], ip + 3)}')
+            lines.append(f'    write(c, {value})')
+            lines.append('    if c in code:')
+            lines.append(f'        return {next_ip}, rb, {n}, c')
+            ip = next_ip
+        lines.append(f'    return {ip}, rb, {n}, None')
+
+        source = f'def block_{start}(rb, budget=None, get=get, Z=Z, write=write, code=code):\n' + '\n'.join(lines)
+        namespace = {'get': memory.pages.get, 'Z': ZERO_PAGE, 'write': memory.__setitem__, 'code': self.code}
+        exec(compile(source, f'<intcode block {start}>', 'exec'), namespace)
+        block = namespace[f'block_{start}']
+        loop = self.counted_loop(body, start) if not runtime else None
+        if loop is not None:
+            block = CountedLoop(self, block, start, ip, n, *loop)
+        return self.register(start, ip, block, runtime)
+
+    @staticmethod
+    def counted_loop(body, start):
+        """(operations, jump) for CountedLoop if `body` is a loop back to `start` it can solve, else None."""
+        opcode, (_, mode_2, _), words = body[-1]
+        if opcode not in (5, 6) or mode_2 != 1 or words[1] != start:
+            return None
+        operations = []
+        for opcode, modes, words in body[:-1]:
+            if opcode not in (1, 7, 8) or modes[2] == 1:
+                return None
+            target = (modes[2], words[2])
+            operands = [(modes[0], words[0]), (modes[1], words[1])]
+            if opcode == 1 and target in operands and operands[1 - operands.index(target)][0] == 1:
+                operations.append(('add', target, operands[1 - operands.index(target)][1]))
+            elif opcode != 1:
+                operations.append(('compare', opcode, *operands, target))
+            else:
+                return None
+        return operations, (body[-1][0], (body[-1][1][0], body[-1][2][0]))
+
+    def execute(self, vm, stop_on_output=False, max_instructions=None):
+        memory = vm.memory
+        if memory is not self.memory:
+            self.memory = memory
+            self.blocks.clear()
+            self.block_ends.clear()
+            self.code.clear()
+            self.rewrites.clear()
+            self.volatile.clear()
+        blocks = self.blocks
+        code = self.code
+        input_buffer = vm.input_buffer
+        do_output = vm.do_output
+        ip = vm.ip if vm.last_instruction_address is None else vm.last_instruction_address
+        rb = vm.relative_base
+        count = 0
+        vm.last_instruction_address = None
+        vm.running = True
+        # Compiled blocks write memory without maintaining the decode cache of tick().
+        vm.decoded.clear()
+        # A block may run up to MAX_BLOCK_LENGTH instructions, the last few of a budget are stepped one by one.
+        limit = None if max_instructions is None else max_instructions - self.MAX_BLOCK_LENGTH
+        budget = None
+        try:
+            while True:
+                if limit is not None:
+                    if count > limit:
+                        break
+                    budget = max_instructions - count
+                block = blocks.get(ip)
+                if block is None:
+                    block = self.compile_block(memory, ip)
+                if block.__class__ is not tuple:
+                    ip, rb, n, hit = block(rb, budget)
+                    count += n
+                    if hit is not None:
+                        if hit == FAULT:
+                            break
+                        self.invalidate(hit)
+                    continue
+
+                opcode, mode_1, _, _, _ = block
+                count += 1
+                if opcode == 99:
+                    vm.running = False
+                    vm.done = True
+                    return HALTED
+                a = memory[ip + 1]
+                if mode_1 == 2:
+                    a += rb
+                if opcode == 3:
+                    if mode_1 == 1:
+                        a = ip + 1
+                    if not len(input_buffer):
+                        count -= 1
+                        vm.waiting_for_input = True
+                        vm.running = False
+                        return WAITING_FOR_INPUT
+                    memory[a] = input_buffer.pop()
+                    if a in code:
+                        self.invalidate(a)
+                    vm.waiting_for_input = False
+                    ip += 2
+                elif opcode == 4:
+                    if mode_1 != 1:
+                        a = memory[a]
+                    ip += 2
+                    do_output(a)
+                    if stop_on_output:
+                        return OUTPUT
+                else:
+                    raise ValueError(f'Unknown opcode {opcode} at address {ip}')
+        finally:
+            vm.ip = ip
+            vm.relative_base = rb
+            vm.instruction_count += count
+        # The reference engine raises the fault of an instruction a block stopped before.
+        return ReferenceEngine().execute(vm, stop_on_output, None if max_instructions is None else max_instructions - count)
+
+
+ENGINES[CompiledEngine.name] = CompiledEngine
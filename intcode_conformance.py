@@ -0,0 +1,357 @@
+import argparse
+import random
+import signal
+import sys
+import time
+from collections import namedtuple
+
+from intcode import BUDGET_EXHAUSTED, ENGINE_MODULES, ENGINES, HALTED, OPERAND_COUNTS, DequeIO, IntCode
+from intcode_disasm import WRITE_OPERANDS, disassemble
+from intcode_loader import load_program
+
+BASELINE = 'reference'
+FUZZ_OPCODES = (1, 2, 3, 4, 5, 6, 7, 8, 9)
+FUZZ_WEIGHTS = (6, 4, 2, 3, 2, 2, 2, 2, 4)
+FUZZ_LIMIT = 20000
+FUZZ_TIMEOUT = 5.0
+DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+PADDLE, BALL = 3, 4
+
+Outcome = namedtuple('Outcome', 'transcript error states')
+EngineResult = namedtuple('EngineResult', 'engine outcome instructions seconds')
+
+DAY7_EXAMPLES = [
+    ([3, 15, 3, 16, 1002, 16, 10, 16, 1, 16, 15, 15, 4, 15, 99, 0, 0], [4, 3, 2, 1, 0]),
+    ([3, 23, 3, 24, 1002, 24, 10, 24, 1002, 23, -1, 23, 101, 5, 23, 23, 1, 24, 23, 23, 4, 23, 99, 0, 0],
+     [0, 1, 2, 3, 4]),
+    ([3, 31, 3, 32, 1002, 32, 10, 32, 1001, 31, -2, 31, 1007, 31, 0, 33, 1002, 33, 7, 33, 1, 33, 31, 31, 1, 32,
+      31, 31, 4, 31, 99, 0, 0, 0], [1, 0, 4, 3, 2]),
+]
+DAY7_FEEDBACK_EXAMPLES = [
+    ([3, 26, 1001, 26, -4, 26, 3, 27, 1002, 27, 2, 27, 1, 27, 26, 27, 4, 27, 1001, 28, -1, 28, 1005, 28, 6, 99, 0, 0,
+      5], [9, 8, 7, 6, 5]),
+    ([3, 52, 1001, 52, -5, 52, 3, 53, 1, 52, 56, 54, 1007, 54, 5, 55, 1005, 55, 26, 1001, 54, -5, 54, 1105, 1, 12, 1,
+      53, 54, 53, 1008, 54, 0, 55, 1001, 55, 1, 55, 2, 53, 55, 53, 4, 53, 1001, 56, -1, 56, 1005, 56, 6, 99, 0, 0, 0,
+      0, 10], [9, 7, 8, 5, 6]),
+]
+DAY9_QUINE = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
+# Loops the compiled engine runs in closed form: counting up to a bound, two counters counting down to zero,
+# a relative mode counter compared with EQ, and one that exits after one iteration.
+COUNTED_LOOPS = [
+    [1001, 20, 1, 20, 1007, 20, 5000, 21, 1005, 21, 0, 4, 20, 4, 21, 99, 0, 0, 0, 0, 0, 0],
+    [1101, 7000, 0, 30, 1001, 30, -1, 30, 1001, 31, 3, 31, 1005, 30, 4, 4, 30, 4, 31, 99] + [0] * 12,
+    [109, 40, 21201, 0, 2, 0, 21208, 0, 400, 1, 1006, 41, 2, 204, 0, 204, 1, 99] + [0] * 30,
+    [1101, 900, 0, 30, 1001, 30, -3, 30, 107, 100, 30, 31, 1006, 31, 4, 4, 30, 4, 31, 99] + [0] * 12,
+]
+
+
+def snapshot(vm):
+    """Architectural state of a VM: everything an engine must agree on with the reference engine."""
+    ip = vm.ip if vm.last_instruction_address is None else vm.last_instruction_address
+    pages = {index: tuple(page) for index, page in vm.memory.pages.items() if any(page)}
+    return ip, vm.relative_base, vm.done, vm.waiting_for_input, tuple(vm.input_buffer), pages
+
+
+# Cases are functions of an engine name and a list, to which they append
+# every VM they create, returning whatever the driver observed. The VMs are
+# snapshotted afterwards, also when the case raised.
+
+def batch(program, inputs=(), patch=None):
+    def run(engine, vms):
+        vm = IntCode(program, engine=engine)
+        vms.append(vm)
+        for address, value in (patch or {}).items():
+            vm.write_memory(address, value)
+        return vm.run(inputs)
+    return run
+
+
+def sliced(program, inputs, quantum):
+    """Like batch() but executing `quantum` instructions at a time; every slice must stop in the same place."""
+    def run(engine, vms):
+        vm = IntCode(program, DequeIO(inputs), engine=engine)
+        vms.append(vm)
+        slices = []
+        while True:
+            status = vm.execute(max_instructions=quantum)
+            slices.append((status, snapshot(vm), tuple(vm.output_buffer.drain())))
+            if status != BUDGET_EXHAUSTED:
+                return slices
+    return run
+
+
+def chain(program, phases):
+    def run(engine, vms):
+        signal = 0
+        for phase in phases:
+            vm = IntCode(program, engine=engine)
+            vms.append(vm)
+            signal = vm.run([phase, signal])[0]
+        return signal
+    return run
+
+
+def feedback(program, phases):
+    def run(engine, vms):
+        buffers = [DequeIO([phase]) for phase in phases]
+        buffers[0].add(0)
+        for i in range(len(phases)):
+            vms.append(IntCode(program, buffers[i], buffers[(i + 1) % len(phases)], engine=engine))
+        while not all(vm.done for vm in vms):
+            for vm in vms:
+                vm.execute()
+        return tuple(buffers[0])
+    return run
+
+
+def paint(program, start):
+    def run(engine, vms):
+        vm = IntCode(program, engine=engine)
+        vms.append(vm)
+        panels = {(0, 0): start}
+        x, y = 0, 0
+        direction = 0
+        while True:
+            vm.input_buffer.add(panels.get((x, y), 0))
+            status = vm.execute()
+            if len(vm.output_buffer) >= 2:
+                panels[x, y] = vm.output_buffer.pop()
+                direction = (direction + (1 if vm.output_buffer.pop() else -1)) % 4
+                dx, dy = DIRECTIONS[direction]
+                x, y = x + dx, y + dy
+            if status == HALTED:
+                return sorted(panels.items())
+    return run
+
+
+def breakout(program):
+    def run(engine, vms):
+        vm = IntCode(program, engine=engine)
+        vms.append(vm)
+        vm.write_memory(0, 2)
+        transcript = []
+        ball = paddle = 0
+        while True:
+            status = vm.execute()
+            values = list(vm.output_buffer)
+            vm.output_buffer.clear()
+            transcript.extend(values)
+            for x, y, tile in zip(*[iter(values)] * 3):
+                if tile == BALL and x >= 0:
+                    ball = x
+                elif tile == PADDLE and x >= 0:
+                    paddle = x
+            if status == HALTED:
+                return transcript
+            vm.input_buffer.add((ball > paddle) - (ball < paddle))
+    return run
+
+
+def repo_cases():
+    """Every Intcode program of the day scripts, with the inputs the puzzles use."""
+    day2 = load_program('day2_input.txt')
+    day5 = load_program('day5_input.txt')
+    day7 = load_program('day7_input.txt')
+    day9 = load_program('day9_input.txt')
+    day11 = load_program('day11_input.txt')
+    day13 = load_program('day13_input.txt')
+    cases = {
+        'day2 noun/verb': batch(day2, patch={1: 12, 2: 2}),
+        'day5 diagnostic 1': batch(day5, [1]),
+        'day5 diagnostic 5': batch(day5, [5]),
+        'day7 chain': chain(day7, [1, 0, 4, 3, 2]),
+        'day7 feedback': feedback(day7, [9, 7, 8, 5, 6]),
+        'day9 quine': batch(DAY9_QUINE),
+        'day9 16 digits': batch([1102, 34915192, 34915192, 7, 4, 7, 99, 0]),
+        'day9 large output': batch([104, 1125899906842624, 99]),
+        'day9 BOOST test': batch(day9, [1]),
+        'day9 BOOST sensor': batch(day9, [2]),
+        'day11 paint black': paint(day11, 0),
+        'day11 paint white': paint(day11, 1),
+        'day13 breakout': breakout(day13),
+    }
+    for i, (program, phases) in enumerate(DAY7_EXAMPLES, 1):
+        cases[f'day7 example {i}'] = chain(program, phases)
+    for i, (program, phases) in enumerate(DAY7_FEEDBACK_EXAMPLES, 1):
+        cases[f'day7 feedback example {i}'] = feedback(program, phases)
+    for i, program in enumerate(COUNTED_LOOPS, 1):
+        cases[f'counted loop {i}'] = batch(program)
+    return cases
+
+
+def disassembly_checks():
+    """Name -> whether the static disassembly of a repo program gets a known fact right."""
+    day5 = disassemble(list(load_program('day5_input.txt')))
+    # Its ADD at 2 rewrites the word at 6 (1100) with 1100 plus the input, which runs next.
+    return {
+        'day5 rewrites word 6': 6 in day5.self_modifying and 6 in day5.rewritten and 6 not in day5.invalid,
+        'day5 word 6 is not data': not any(start <= 6 < end for start, end in day5.data_regions),
+    }
+
+
+class CaseTimeout(Exception):
+    pass
+
+
+def alarm(signum, frame):
+    raise CaseTimeout()
+
+
+def run_case(case, engine, timeout=None):
+    """Run `case` on `engine`; with `timeout` seconds a run taking longer counts as a failure of its own."""
+    vms = []
+    if timeout is not None:
+        signal.signal(signal.SIGALRM, alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    started = time.perf_counter()
+    try:
+        transcript = case(engine, vms)
+        error = None
+    except CaseTimeout:
+        transcript, error = None, 'timeout'
+    except Exception:
+        # Engines may raise different exception types for the same fault.
+        transcript, error = None, 'error'
+    finally:
+        if timeout is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    seconds = time.perf_counter() - started
+    outcome = Outcome(transcript, error, [snapshot(vm) for vm in vms])
+    return EngineResult(engine, outcome, sum(vm.instruction_count for vm in vms), seconds)
+
+
+def compare(case, engines, timeout=None):
+    """Run `case` on every engine; returns (results, names of engines disagreeing with BASELINE)."""
+    results = [run_case(case, engine, timeout) for engine in engines]
+    expected = results[0].outcome
+    return results, [result.engine for result in results[1:] if result.outcome != expected]
+
+
+def random_program(rng):
+    """Random program, heavy on self-modification and relative addressing.
+
+    Relative base adjustments, relative operands and now and then another
+    operand are negative, so programs also reach negative addresses, which
+    every engine has to fault on the same way.
+    """
+    def operand_word(mode, stop):
+        if rng.random() < (0.2 if mode == 2 else 0.05):
+            return rng.randrange(-8, 0)
+        return rng.randrange(stop)
+
+    length = rng.randint(16, 96)
+    words = []
+    starts = []
+    while len(words) < length:
+        if starts and rng.random() < 0.1:
+            # Counted loop back to an earlier instruction, so blocks run again after being rewritten,
+            # or back to its own counter, which the compiled engine runs in closed form.
+            counter, flag = length + 100 + 2 * len(starts), length + 101 + 2 * len(starts)
+            target = rng.choice(starts + [len(words)])
+            words += [1001, counter, 1, counter, 1007, counter, rng.randint(2, 20), flag, 1005, flag, target]
+            continue
+        starts.append(len(words))
+        opcode = rng.choices(FUZZ_OPCODES, FUZZ_WEIGHTS)[0]
+        word = opcode
+        operands = []
+        for i in range(OPERAND_COUNTS[opcode]):
+            if WRITE_OPERANDS.get(opcode) == i:
+                mode = rng.choices((0, 1, 2), (4, 1, 4))[0]
+                if mode == 0 and rng.random() < 0.5:
+                    # Overwrite code that has yet to run.
+                    operand = rng.randrange(len(words), length + 1)
+                else:
+                    operand = operand_word(mode, length + 8)
+            elif opcode in (5, 6) and i == 1:
+                mode = rng.choices((0, 1, 2), (1, 6, 1))[0]
+                operand = operand_word(mode, length)
+            elif opcode == 9:
+                mode = rng.choices((0, 1, 2), (1, 4, 1))[0]
+                operand = rng.randrange(-4, 8)
+            else:
+                mode = rng.choices((0, 1, 2), (3, 3, 3))[0]
+                operand = operand_word(mode, length + 8)
+            word += mode * 10 ** (2 + i)
+            operands.append(operand)
+        words.append(word)
+        words.extend(operands)
+    words.append(99)
+    words.extend(rng.randrange(length) for _ in range(8))
+    return words
+
+
+def terminates(program, inputs, limit=FUZZ_LIMIT):
+    """Whether the reference engine stops within `limit` instructions: halts, blocks on input or faults."""
+    vm = IntCode(program, DequeIO(inputs), engine=BASELINE)
+    try:
+        return vm.execute(max_instructions=limit) != BUDGET_EXHAUSTED
+    except Exception:
+        return True
+
+
+def fuzz(n, engines, seed=0):
+    """Compare the engines on `n` random programs; returns a list of (program, inputs, engines) mismatches."""
+    rng = random.Random(seed)
+    mismatches = []
+    tried = 0
+    while n:
+        tried += 1
+        program = random_program(rng)
+        inputs = [rng.randrange(64) for _ in range(rng.randrange(4))]
+        if not terminates(program, inputs):
+            continue
+        n -= 1
+        # A diverging engine may well loop forever instead of halting.
+        _, failed = compare(batch(program, inputs), engines, timeout=FUZZ_TIMEOUT)
+        if not failed:
+            _, failed = compare(sliced(program, inputs, rng.randint(1, 100)), engines, timeout=FUZZ_TIMEOUT)
+        if failed:
+            mismatches.append((program, inputs, failed))
+    return mismatches, tried
+
+
+def main(argv=None):
+    """python intcode_conformance.py [--engines NAME...] [--fuzz N] [--seed S]
+
+    Runs every repo program on every engine, checks the disassembler on
+    them, prints the instructions per second of each engine, then fuzzes. Exits with status 1 if any engine
+    disagreed with the reference engine.
+    """
+    parser = argparse.ArgumentParser(description='Check that all IntCode engines agree with the reference engine.')
+    parser.add_argument('--engines', nargs='+', default=sorted({*ENGINES, *ENGINE_MODULES}))
+    parser.add_argument('--fuzz', type=int, default=300, help='number of random programs to compare')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    engines = [BASELINE] + [engine for engine in args.engines if engine != BASELINE]
+
+    failures = 0
+    totals = {engine: [0, 0.0] for engine in engines}
+    for name, case in repo_cases().items():
+        results, failed = compare(case, engines)
+        for result in results:
+            totals[result.engine][0] += result.instructions
+            totals[result.engine][1] += result.seconds
+        timings = '  '.join(f'{result.engine} {result.seconds:.3f}s' for result in results)
+        print(f'{"FAIL" if failed else "ok":<4} {name:<26} {timings}')
+        failures += bool(failed)
+
+    for name, passed in disassembly_checks().items():
+        print(f'{"ok" if passed else "FAIL":<4} {name}')
+        failures += not passed
+
+    print()
+    print(f'{"engine":<10} {"instructions":>12} {"seconds":>8} {"instructions/s":>15}')
+    for engine, (instructions, seconds) in totals.items():
+        print(f'{engine:<10} {instructions:>12,} {seconds:>8.3f} {instructions / seconds:>15,.0f}')
+
+    mismatches, tried = fuzz(args.fuzz, engines, args.seed)
+    print()
+    print(f'FUZZ: {args.fuzz} terminating programs out of {tried}, {len(mismatches)} mismatches')
+    for program, inputs, failed in mismatches[:5]:
+        print(f'  {",".join(failed)} disagree on inputs {inputs}, program {program}')
+    failures += len(mismatches)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+from collections import namedtuple
+
+from intcode import WAITING_FOR_INPUT, run_ticks
+
+BREAKPOINT = 'breakpoint'
+# What stopped the VM: 'breakpoint', 'condition', 'read' or 'write', the instruction address and the watched cell.
+Hit = namedtuple('Hit', 'reason ip address')
+READS = {1: (1, 2), 2: (1, 2), 4: (1,), 5: (1, 2), 6: (1, 2), 7: (1, 2), 8: (1, 2), 9: (1,)}
+WRITES = {1: 3, 2: 3, 3: 1, 7: 3, 8: 3}
+
+
+class Debugger:
+    """Breakpoints on addresses, watchpoints on memory cells and conditions on the VM.
+
+    Attach it with `vm.debugger = Debugger()`. While nothing is set execute()
+    runs the VM's engine as usual, otherwise the debugger steps the
+    program with tick() and checks before every instruction. When one
+    fires, execute() returns BREAKPOINT with the instruction not yet
+    executed and `hit` telling why; the VM can then be inspected and
+    modified, and the next execute() resumes it.
+    """
+
+    def __init__(self):
+        self.breakpoints = {}
+        self.conditions = []
+        self.reads = set()
+        self.writes = set()
+        self.hit = None
+        self.resume_at = None
+
+    def fork(self):
+        """Debugger with the same breakpoints and watchpoints for a forked VM, paused where this one is."""
+        child = Debugger()
+        child.breakpoints = dict(self.breakpoints)
+        child.conditions = list(self.conditions)
+        child.reads = set(self.reads)
+        child.writes = set(self.writes)
+        child.hit = self.hit
+        child.resume_at = self.resume_at
+        return child
+
+    def break_at(self, address, condition=None):
+        """Stop before the instruction at `address`, only if `condition(vm)` is true when given."""
+        self.breakpoints[address] = condition
+
+    def break_when(self, condition):
+        """Stop before any instruction for which `condition(vm)` is true, e.g. `lambda vm: vm.relative_base > 100`."""
+        self.conditions.append(condition)
+
+    def watch(self, address, read=False, write=True):
+        """Stop before an instruction reading or writing the memory cell at `address`."""
+        if read:
+            self.reads.add(address)
+        if write:
+            self.writes.add(address)
+
+    def clear(self):
+        self.breakpoints.clear()
+        self.conditions.clear()
+        self.reads.clear()
+        self.writes.clear()
+        self.resume_at = None
+
+    def active(self):
+        return bool(self.breakpoints or self.conditions or self.reads or self.writes)
+
+    def execute(self, vm, stop_on_output=False, max_instructions=None):
+        self.hit = None
+        status = run_ticks(vm, stop_on_output, max_instructions, before=self.before)
+        if status == WAITING_FOR_INPUT:
+            # The input instruction runs again once input arrives, without stopping twice.
+            self.resume_at = vm.last_instruction_address
+        return status
+
+    def before(self, vm, ip):
+        if ip != self.resume_at:
+            self.hit = self.check(vm, ip)
+            if self.hit is not None:
+                self.resume_at = ip
+                return BREAKPOINT
+        self.resume_at = None
+        return None
+
+    def check(self, vm, ip):
+        if ip in self.breakpoints:
+            condition = self.breakpoints[ip]
+            if condition is None or condition(vm):
+                return Hit('breakpoint', ip, None)
+        for condition in self.conditions:
+            if condition(vm):
+                return Hit('condition', ip, None)
+        if self.reads or self.writes:
+            opcode, mode_1, mode_2, mode_3, _ = vm.decode_instruction(ip)
+            modes = (None, mode_1, mode_2, mode_3)
+            for i in READS.get(opcode, ()):
+                address = self.address(vm, ip, i, modes[i])
+                if address in self.reads:
+                    return Hit('read', ip, address)
+            if opcode in WRITES:
+                i = WRITES[opcode]
+                address = self.address(vm, ip, i, modes[i])
+                if address in self.writes:
+                    return Hit('write', ip, address)
+        return None
+
+    @staticmethod
+    def address(vm, ip, i, mode):
+        if mode == 1:
+            return ip + i
+        if mode == 2:
+            return vm.read_memory(ip + i) + vm.relative_base
+        return vm.read_memory(ip + i)
@@ -0,0 +1,269 @@
+from collections import namedtuple
+
+from intcode import OPCODE_NAMES, OPERAND_COUNTS, decode
+
+WRITE_OPERANDS = {1: 2, 2: 2, 3: 0, 7: 2, 8: 2}
+
+Instruction = namedtuple('Instruction', 'address opcode modes operands')
+BasicBlock = namedtuple('BasicBlock', 'start end instructions successors')
+
+
+def format_operand(mode, operand):
+    if mode == 1:
+        return str(operand)
+    if mode == 2:
+        return f'[rb{operand:+}]'
+    return f'[{operand}]'
+
+
+def format_instruction(instruction):
+    operands = ', '.join(format_operand(mode, operand) for mode, operand in zip(instruction.modes, instruction.operands))
+    return f'{OPCODE_NAMES[instruction.opcode]:<4} {operands}'.rstrip()
+
+
+def jump_info(instruction):
+    """Return (target, falls_through) of a jump; target is None when it is not an immediate."""
+    condition, target = instruction.operands
+    condition_mode, target_mode = instruction.modes
+    if condition_mode == 1:
+        falls_through = (condition == 0) if instruction.opcode == 5 else (condition != 0)
+    else:
+        falls_through = True
+    return (target if target_mode == 1 else None), falls_through
+
+
+class ControlFlowGraph:
+    """Static disassembly of an Intcode program image.
+
+    Code is discovered by following fall-through and immediate jump targets
+    from the entry points, so every reachable word is decoded once.
+    Computed jumps cannot be followed. Intcode calls store their return
+    address with an immediate ADD or MUL before jumping away, so the word
+    after an unconditional jump also counts as code when such a constant
+    points at it.
+
+    Control flow reaching a word that some instruction writes to is
+    self-modifying code, not an invalid instruction: day 5 turns the word
+    at 6 into an ADD before running it. When the written value follows
+    from the program image (immediates and words of the image) the word is
+    decoded as that value, otherwise discovery stops there.
+
+    Attributes:
+      instructions    address -> Instruction
+      blocks          start -> BasicBlock, successors only list resolved targets
+      indirect_jumps  addresses of jumps whose target is computed at run time
+      data_regions    [start, end) ranges of words not decoded as code
+      self_modifying  code words some instruction statically writes to
+      dynamic_writes  addresses of instructions writing through relative mode
+      patched         address -> word decoded in place of the image word it is overwritten with
+      rewritten       addresses reached by control flow holding a word written before it runs
+      invalid         addresses reached by control flow that hold no valid instruction
+    """
+
+    def __init__(self, program, entries=(0,)):
+        self.program = program
+        self.instructions = {}
+        self.patched = {}
+        self.rewritten = set()
+        self.invalid = set()
+        self.indirect_jumps = set()
+        self.leaders = set(entries)
+        self.return_sites = set()
+        constants = set()
+
+        worklist = list(entries)
+        while worklist:
+            while worklist:
+                address = worklist.pop()
+                if address in self.instructions or address in self.invalid:
+                    continue
+                instruction = self.decode_at(address, self.patched.get(address))
+                if instruction is None:
+                    self.invalid.add(address)
+                    continue
+                self.instructions[address] = instruction
+                if instruction.opcode in (1, 2) and instruction.modes[:2] == (1, 1):
+                    a, b = instruction.operands[:2]
+                    constants.add(a + b if instruction.opcode == 1 else a * b)
+                worklist.extend(self.successors(instruction))
+            worklist = [address for address in self.return_sites & constants if address not in self.instructions]
+            self.leaders.update(worklist)
+            if not worklist:
+                worklist = self.patch_invalid()
+
+        self.code_words = {}
+        for address, instruction in self.instructions.items():
+            for word in range(address, address + 1 + len(instruction.operands)):
+                self.code_words.setdefault(word, address)
+        for address in self.rewritten:
+            self.code_words.setdefault(address, address)
+        self.blocks = self.build_blocks()
+        self.data_regions = self.build_data_regions()
+        self.self_modifying, self.dynamic_writes = self.find_writes()
+
+    def decode_at(self, address, word=None):
+        if not 0 <= address < len(self.program):
+            return None
+        opcode, mode_1, mode_2, mode_3, operand_count = decode(self.program[address] if word is None else word)
+        modes = (mode_1, mode_2, mode_3)[:operand_count]
+        if opcode not in OPERAND_COUNTS or any(mode > 2 for mode in modes):
+            return None
+        if address + operand_count >= len(self.program):
+            return None
+        operands = tuple(self.program[address + 1:address + 1 + operand_count])
+        return Instruction(address, opcode, modes, operands)
+
+    def static_writes(self):
+        """target -> set of values written there by decoded instructions, None for values unknown statically."""
+        targets = []
+        for address, instruction in self.instructions.items():
+            if instruction.opcode not in WRITE_OPERANDS:
+                continue
+            index = WRITE_OPERANDS[instruction.opcode]
+            mode = instruction.modes[index]
+            if mode != 2:
+                targets.append((address + 1 + index if mode == 1 else instruction.operands[index], instruction))
+        written = {target for target, _ in targets}
+        writes = {}
+        for target, instruction in targets:
+            writes.setdefault(target, set()).add(self.static_value(instruction, written))
+        return writes
+
+    def static_value(self, instruction, written):
+        """Value `instruction` writes if it only depends on immediates and image words nothing writes to."""
+        if instruction.opcode == 3:
+            return None
+        values = []
+        for mode, operand in zip(instruction.modes[:2], instruction.operands[:2]):
+            if mode == 1:
+                values.append(operand)
+            elif mode == 0 and 0 <= operand < len(self.program) and operand not in written:
+                values.append(self.program[operand])
+            else:
+                return None
+        a, b = values
+        return {1: a + b, 2: a * b, 7: int(a < b), 8: int(a == b)}[instruction.opcode]
+
+    def patch_invalid(self):
+        """Move written words out of `invalid`; returns those now decodable from the value written."""
+        writes = self.static_writes()
+        decodable = []
+        for address in sorted(self.invalid & writes.keys()):
+            self.invalid.discard(address)
+            self.rewritten.add(address)
+            values = writes[address]
+            if len(values) == 1 and None not in values:
+                (word,) = values
+                if self.decode_at(address, word) is not None:
+                    self.patched[address] = word
+                    decodable.append(address)
+        return decodable
+
+    def successors(self, instruction):
+        """Statically known successors; records leaders, indirect jumps and return sites on the way."""
+        next_address = instruction.address + 1 + len(instruction.operands)
+        if instruction.opcode == 99:
+            return []
+        if instruction.opcode not in (5, 6):
+            return [next_address]
+        target, falls_through = jump_info(instruction)
+        successors = []
+        if target is None:
+            self.indirect_jumps.add(instruction.address)
+        else:
+            successors.append(target)
+            self.leaders.add(target)
+        if falls_through:
+            successors.append(next_address)
+            self.leaders.add(next_address)
+        else:
+            self.return_sites.add(next_address)
+        return successors
+
+    def build_blocks(self):
+        blocks = {}
+        for start in sorted(self.leaders):
+            if start not in self.instructions:
+                continue
+            block = []
+            address = start
+            while address in self.instructions and (address == start or address not in self.leaders):
+                instruction = self.instructions[address]
+                block.append(instruction)
+                address += 1 + len(instruction.operands)
+                if instruction.opcode in (5, 6, 99):
+                    break
+            last = block[-1]
+            if last.opcode == 99:
+                successors = []
+            elif last.opcode in (5, 6):
+                target, falls_through = jump_info(last)
+                successors = ([] if target is None else [target]) + ([address] if falls_through else [])
+            else:
+                successors = [address]
+            blocks[start] = BasicBlock(start, address, block, successors)
+        return blocks
+
+    def build_data_regions(self):
+        regions = []
+        start = None
+        for address in range(len(self.program) + 1):
+            is_data = address < len(self.program) and address not in self.code_words
+            if is_data and start is None:
+                start = address
+            elif not is_data and start is not None:
+                regions.append((start, address))
+                start = None
+        return regions
+
+    def find_writes(self):
+        self_modifying = set()
+        dynamic_writes = set()
+        for address, instruction in self.instructions.items():
+            if instruction.opcode not in WRITE_OPERANDS:
+                continue
+            index = WRITE_OPERANDS[instruction.opcode]
+            mode = instruction.modes[index]
+            if mode == 2:
+                dynamic_writes.add(address)
+                continue
+            target = address + 1 + index if mode == 1 else instruction.operands[index]
+            if target in self.code_words:
+                self_modifying.add(target)
+        return self_modifying, dynamic_writes
+
+    def edges(self):
+        return [(start, successor) for start, block in self.blocks.items() for successor in block.successors]
+
+    def format(self):
+        """Disassembly listing; block starts are labelled and data regions dumped as raw words."""
+        lines = []
+        regions = {start: end for start, end in self.data_regions}
+        address = 0
+        while address < len(self.program):
+            if address in regions:
+                end = regions[address]
+                lines.append(f'{address:>8}: DATA {", ".join(str(word) for word in self.program[address:end])}')
+                address = end
+                continue
+            instruction = self.instructions.get(address)
+            if instruction is None and address in self.rewritten:
+                lines.append(f'{address:>8}: {self.program[address]} ; rewritten before it runs')
+                address += 1
+                continue
+            if instruction is None:
+                # Operand word of an overlapping instruction, listed with its owner.
+                address += 1
+                continue
+            if address in self.blocks:
+                lines.append(f'block_{address}:')
+            flags = ' ; self-modified' if any(
+                word in self.self_modifying for word in range(address, address + 1 + len(instruction.operands))
+            ) else ''
+            lines.append(f'{address:>8}: {format_instruction(instruction)}{flags}')
+            address += 1 + len(instruction.operands)
+        return '\n'.join(lines)
+
+
+def disassemble(program, entries=(0,)):
+    return ControlFlowGraph(program, entries)
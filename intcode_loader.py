@@ -0,0 +1,104 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+
+CACHE_SUFFIX = '.int64'
+MAGIC = b'ICP1'
+# Magic, source mtime_ns, source size, SHA-256 of the source, number of words; 64 bytes keep the words aligned.
+HEADER = struct.Struct('<4s4xqq32sq')
+CHUNK_SIZE = 1 << 16
+
+
+def parse_program(f, chunk_size=CHUNK_SIZE):
+    """Parse a comma separated program from binary file `f` one chunk at a time.
+
+    Returns (words, SHA-256 digest of the text). Words are an array('q'),
+    or a list once one of them does not fit into int64.
+    """
+    words = array('q')
+    digest = hashlib.sha256()
+    rest = b''
+    while True:
+        chunk = f.read(chunk_size)
+        digest.update(chunk)
+        parts = (rest + chunk).split(b',')
+        rest = parts.pop() if chunk else b''
+        numbers = [int(part) for part in parts if chunk or part.strip()]
+        if isinstance(words, array):
+            try:
+                words.extend(array('q', numbers))
+                numbers = []
+            except OverflowError:
+                words = words.tolist()
+        words.extend(numbers)
+        if not chunk:
+            return words, digest.digest()
+
+
+def cache_path(path):
+    return path + CACHE_SUFFIX
+
+
+def read_cache(path, stat):
+    """Words of the sidecar cache of `path` as an int64 memoryview, or None when it is missing or stale."""
+    try:
+        with open(cache_path(path), 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, mtime_ns, size, _, count = HEADER.unpack_from(data)
+    if (magic, mtime_ns, size) != (MAGIC, stat.st_mtime_ns, stat.st_size) or len(data) != HEADER.size + 8 * count:
+        return None
+    return memoryview(data)[HEADER.size:].cast('q')
+
+
+def write_cache(path, stat, words, digest):
+    """Store `words` next to `path`; if only the mtime changed just the header is rewritten."""
+    header = HEADER.pack(MAGIC, stat.st_mtime_ns, stat.st_size, digest, len(words))
+    try:
+        with open(cache_path(path), 'r+b') as f:
+            old = f.read(HEADER.size)
+            if len(old) == HEADER.size and HEADER.unpack(old)[3:] == (digest, len(words)):
+                f.seek(0)
+                f.write(header)
+                return
+    except OSError:
+        pass
+    try:
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(words.tobytes())
+        os.replace(temporary, cache_path(path))
+    except OSError:
+        # A read-only checkout just goes without the cache.
+        pass
+
+
+def load_program(path, cache=True):
+    """Program image stored as comma separated text in `path`.
+
+    The text is parsed in chunks and the words are written as packed int64
+    to a sidecar file next to it, keyed by the text's mtime, size and hash.
+    Later loads map that file instead of parsing. Either way the program
+    is returned as a read-only int64 memoryview; use list() where a list is
+    needed. Programs with words beyond int64 are returned as a list and
+    never cached.
+    """
+    stat = os.stat(path)
+    if cache:
+        words = read_cache(path, stat)
+        if words is not None:
+            return words
+    with open(path, 'rb') as f:
+        words, digest = parse_program(f)
+    if not isinstance(words, array):
+        return words
+    if cache:
+        write_cache(path, stat, words, digest)
+    return memoryview(words).toreadonly()
@@ -0,0 +1,312 @@
+import multiprocessing
+import time
+from collections import deque, namedtuple
+
+from intcode import IO, DequeIO, IntCode
+from intcode_scheduler import QUANTUM
+
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+RING_CAPACITY = 4096
+# Per worker status slots: idle flag, epoch, instructions run, parked producers.
+STATUS_SLOTS = 4
+# Polls without progress after which a network with parked producers counts as deadlocked.
+DEADLOCK_POLLS = 50
+
+WorkerStats = namedtuple('WorkerStats', 'worker vms instructions seconds instructions_per_second')
+ShardResult = namedtuple('ShardResult', 'outputs pending stats')
+BatchResult = namedtuple('BatchResult', 'index outputs memory cached')
+
+# Program image and result cache of a run_many() pool worker, set once by the pool initializer.
+batch_program = None
+batch_cache = None
+
+
+class SharedRingIO(IO):
+    """Single producer, single consumer int64 ring buffer in shared memory.
+
+    Slot 0 counts items read, slot 1 counts items written, the remaining
+    slots hold the data. The producer only ever advances the write counter
+    and the consumer the read counter, so no lock is needed.
+
+    add() never waits: items that do not fit go to `backlog`, which lives
+    in the producer's process only. While it is non-empty the ring would
+    block, the producer's worker parks the VM and moves the backlog over
+    with flush() as the consumer makes room.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self.capacity = capacity
+        self.array = multiprocessing.RawArray('q', capacity + 2)
+        self.backlog = deque()
+
+    def __len__(self):
+        return self.array[1] - self.array[0]
+
+    def __iter__(self):
+        array = self.array
+        return iter([array[2 + i % self.capacity] for i in range(array[0], array[1])])
+
+    def add(self, item):
+        if not INT64_MIN <= item <= INT64_MAX:
+            raise OverflowError(f'{item} does not fit into a shared int64 ring buffer')
+        array = self.array
+        written = array[1]
+        if self.backlog or written - array[0] >= self.capacity:
+            self.backlog.append(item)
+            return
+        array[2 + written % self.capacity] = item
+        array[1] = written + 1
+
+    def would_block(self):
+        return bool(self.backlog)
+
+    def flush(self):
+        """Move as much of the backlog into the ring as fits."""
+        array = self.array
+        backlog = self.backlog
+        written = array[1]
+        free = self.capacity - (written - array[0])
+        for _ in range(min(free, len(backlog))):
+            array[2 + written % self.capacity] = backlog.popleft()
+            written += 1
+        array[1] = written
+
+    def pop(self):
+        array = self.array
+        read = array[0]
+        if read == array[1]:
+            raise IndexError('pop from an empty ring buffer')
+        item = array[2 + read % self.capacity]
+        array[0] = read + 1
+        return item
+
+    def clear(self):
+        self.array[0] = self.array[1]
+
+    def extend(self, iterable):
+        for item in iterable:
+            self.add(item)
+
+    def copy(self):
+        return DequeIO(self)
+
+
+def partition(n_vms, workers):
+    """Split VM indices into `workers` contiguous chunks, neighbours in a chain mostly stay local."""
+    size, extra = divmod(n_vms, workers)
+    chunks = []
+    start = 0
+    for worker in range(workers):
+        end = start + size + (worker < extra)
+        chunks.append(range(start, end))
+        start = end
+    return chunks
+
+
+def shard_worker(worker, indices, programs, links, inputs, rings, status, halted, stop, results):
+    """Run the VMs in `indices` round robin, QUANTUM instructions at a time, until the coordinator sets `stop`.
+
+    A VM whose ring to another worker would block is parked until the
+    backlog is flushed; output for a VM that has halted is dropped.
+    """
+    local = set(indices)
+    channels = {}
+    for i in indices:
+        channels[i] = rings[i] if i in rings else DequeIO(inputs.get(i))
+    sinks = {}
+    outgoing = {}
+    vms = []
+    for i in indices:
+        if i in links:
+            target = links[i]
+            if target in local:
+                output_buffer = channels[target]
+            else:
+                output_buffer = outgoing[i] = rings[target]
+        else:
+            output_buffer = sinks[i] = DequeIO()
+        vms.append((i, IntCode(programs[i], input_buffer=channels[i], output_buffer=output_buffer)))
+
+    idle, epoch, instructions, parked = range(STATUS_SLOTS * worker, STATUS_SLOTS * (worker + 1))
+    started = time.perf_counter()
+    while not stop.value:
+        for i, ring in outgoing.items():
+            if ring.backlog:
+                if halted[links[i]]:
+                    ring.backlog.clear()
+                else:
+                    ring.flush()
+        blocked = {i for i, ring in outgoing.items() if ring.would_block()}
+        status[parked] = len(blocked)
+        runnable = [
+            (i, vm) for i, vm in vms
+            if not vm.done and i not in blocked and (not vm.waiting_for_input or len(vm.input_buffer))
+        ]
+        if not runnable:
+            status[idle] = 1
+            time.sleep(0.0005)
+            continue
+        status[idle] = 0
+        status[epoch] += 1
+        for i, vm in runnable:
+            vm.execute(max_instructions=QUANTUM)
+            if vm.done:
+                halted[i] = 1
+        status[instructions] = sum(vm.instruction_count for i, vm in vms)
+    seconds = time.perf_counter() - started
+    pending = {i: tuple(channel) for i, channel in channels.items() if i not in rings and len(channel)}
+    backlogs = {links[i]: tuple(ring.backlog) for i, ring in outgoing.items() if ring.backlog}
+    results.put((worker, {i: tuple(sink) for i, sink in sinks.items()}, pending, backlogs, seconds))
+
+
+def run_sharded(programs, links=None, inputs=None, workers=None, poll_interval=0.001, timeout=None):
+    """Run a network of IntCode VMs spread over several worker processes.
+
+    `programs` holds one program image per VM, `links` maps a VM index to
+    the index of the VM consuming its output and `inputs` maps a VM index to
+    its initial input values. Every VM can be fed by at most one other VM.
+    VMs without an outgoing link collect their output, which is returned
+    once the whole network is quiescent: every VM has halted or waits for
+    input that nobody is going to send. A network whose producers stay
+    parked on full rings for DEADLOCK_POLLS polls without any progress is
+    deadlocked and returned the same way. With `timeout` seconds a network
+    still running after that long raises TimeoutError.
+
+    Returns a ShardResult: `outputs` maps VM index to its output tuple,
+    `pending` maps VM index to input values it never consumed and `stats`
+    holds one WorkerStats per worker.
+    """
+    links = links or {}
+    inputs = inputs or {}
+    if len(set(links.values())) != len(links):
+        raise ValueError('Every VM can be fed by at most one other VM')
+    workers = min(workers or multiprocessing.cpu_count(), len(programs))
+    chunks = partition(len(programs), workers)
+    owner = {i: worker for worker, chunk in enumerate(chunks) for i in chunk}
+
+    rings = {}
+    for source, target in links.items():
+        if owner[source] != owner[target]:
+            initial = inputs.get(target, ())
+            rings[target] = SharedRingIO(max(RING_CAPACITY, len(initial)))
+            rings[target].extend(initial)
+
+    status = multiprocessing.RawArray('q', STATUS_SLOTS * workers)
+    halted = multiprocessing.RawArray('b', len(programs))
+    stop = multiprocessing.RawValue('b', 0)
+    results = multiprocessing.Queue()
+    processes = []
+    for worker, chunk in enumerate(chunks):
+        worker_programs = {i: list(programs[i]) for i in chunk}
+        worker_inputs = {i: inputs[i] for i in chunk if i in inputs and i not in rings}
+        process = multiprocessing.Process(
+            target=shard_worker,
+            args=(worker, chunk, worker_programs, links, worker_inputs, rings, status, halted, stop, results),
+        )
+        process.start()
+        processes.append(process)
+
+    # Quiescent: all workers idle, no undelivered items for running VMs, and
+    # no worker has done any work between two consecutive observations.
+    # Deadlocked: all workers idle with producers parked on full rings, and
+    # no work done for DEADLOCK_POLLS observations.
+    deadline = None if timeout is None else time.monotonic() + timeout
+    last_epochs = None
+    stalled = 0
+    while True:
+        time.sleep(poll_interval)
+        if any(process.exitcode for process in processes):
+            stop.value = 1
+            raise RuntimeError('An IntCode worker process failed')
+        if deadline is not None and time.monotonic() > deadline:
+            stop.value = 1
+            for process in processes:
+                process.terminate()
+            raise TimeoutError(f'IntCode network still running after {timeout} seconds')
+        idle = all(status[STATUS_SLOTS * worker] for worker in range(workers))
+        quiet = idle and not any(len(ring) for target, ring in rings.items() if not halted[target])
+        stuck = idle and any(status[STATUS_SLOTS * worker + 3] for worker in range(workers))
+        epochs = [status[STATUS_SLOTS * worker + 1] for worker in range(workers)]
+        stalled = stalled + 1 if stuck and epochs == last_epochs else 0
+        if quiet and epochs == last_epochs or stalled >= DEADLOCK_POLLS:
+            break
+        last_epochs = epochs if quiet or stuck else None
+    stop.value = 1
+
+    outputs = {}
+    pending = {target: tuple(ring) for target, ring in rings.items() if len(ring)}
+    stats = []
+    for _ in processes:
+        worker, worker_outputs, worker_pending, backlogs, seconds = results.get()
+        outputs.update(worker_outputs)
+        pending.update(worker_pending)
+        for target, backlog in backlogs.items():
+            pending[target] = pending.get(target, ()) + backlog
+        instructions = status[STATUS_SLOTS * worker + 2]
+        stats.append(WorkerStats(worker, len(chunks[worker]), instructions, seconds, instructions / seconds))
+    for process in processes:
+        process.join()
+    return ShardResult(outputs, pending, sorted(stats))
+
+
+def init_batch_worker(program, cache):
+    global batch_program, batch_cache
+    batch_program = program
+    batch_cache = cache
+
+
+def run_batch_job(job):
+    index, inputs, patch, peek = job
+    if batch_cache is not None:
+        key = batch_cache.key(batch_program, list(inputs), sorted(patch.items()), list(peek))
+        value = batch_cache.get(key)
+        if value is not None:
+            return BatchResult(index, tuple(value[0]), tuple(value[1]), True)
+    vm = IntCode(batch_program)
+    for address, value in patch.items():
+        vm.write_memory(address, value)
+    outputs = vm.run(inputs)
+    memory = tuple(vm.memory[address] for address in peek)
+    if batch_cache is not None:
+        batch_cache.put(key, [outputs, memory])
+    return BatchResult(index, outputs, memory, False)
+
+
+def run_many(program, inputs_list=None, workers=None, patches=None, peek=(), stop=None, chunksize=64, cache=None):
+    """Run independent copies of `program` in a process pool.
+
+    Run i gets `inputs_list[i]` as input and has `patches[i]`, a mapping of
+    address to value, written to memory before it starts. The program image
+    is handed to every worker once by the pool initializer, jobs only carry
+    their inputs and patches. Each BatchResult holds the outputs of the run
+    and the final memory values at the addresses in `peek`.
+
+    With `stop`, the pool is terminated as soon as a result satisfies it and
+    only the results finished by then are returned. Results are sorted by
+    run index. With a ResultCache as `cache`, runs seen before are answered
+    from it and the cache's hit counters include the workers' lookups.
+    """
+    if inputs_list is None and patches is None:
+        raise ValueError('inputs_list or patches must describe the runs')
+    if inputs_list is None:
+        inputs_list = [()] * len(patches)
+    if patches is None:
+        patches = [{}] * len(inputs_list)
+    if len(inputs_list) != len(patches):
+        raise ValueError('inputs_list and patches must describe the same number of runs')
+    jobs = [(i, inputs, patch, tuple(peek)) for i, (inputs, patch) in enumerate(zip(inputs_list, patches))]
+
+    results = []
+    # list() as a memory mapped program from load_program() cannot be pickled.
+    with multiprocessing.Pool(workers, initializer=init_batch_worker, initargs=(list(program), cache)) as pool:
+        for result in pool.imap_unordered(run_batch_job, jobs, chunksize):
+            results.append(result)
+            if stop is not None and stop(result):
+                pool.terminate()
+                break
+    if cache is not None:
+        hits = sum(result.cached for result in results)
+        cache.hits += hits
+        cache.misses += len(results) - hits
+    return sorted(results)
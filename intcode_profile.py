@@ -0,0 +1,80 @@
+import json
+from collections import Counter
+
+from intcode import run_ticks
+
+
+class Profiler:
+    """Execution counts per opcode, instruction address and basic block of an IntCode program.
+
+    Attach it with `vm.profiler = Profiler()`; execute() then hands the VM to
+    the profiler, which steps it with tick() and records every instruction.
+    Without a profiler the normal execution paths run untouched.
+
+    A basic block starts at the program entry, after every jump instruction
+    (taken or not) and wherever execution does not fall through from the
+    previous instruction. Branch counts are [taken, not taken] per jump address.
+    """
+
+    def __init__(self):
+        self.opcodes = Counter()
+        self.addresses = Counter()
+        self.blocks = Counter()
+        self.branches = {}
+        self.names = {}
+        self.next_ip = None
+
+    def fork(self):
+        """Empty profiler for a forked VM."""
+        return Profiler()
+
+    def execute(self, vm, stop_on_output=False, max_instructions=None):
+        return run_ticks(vm, stop_on_output, max_instructions, after=self.after)
+
+    def after(self, vm, ip, opcode):
+        self.record(ip, opcode, vm.ip)
+        if opcode not in self.names:
+            self.names[opcode] = vm.opcodes[opcode].__name__
+
+    def record(self, ip, opcode, next_ip):
+        self.opcodes[opcode] += 1
+        self.addresses[ip] += 1
+        if ip != self.next_ip:
+            self.blocks[ip] += 1
+        if opcode == 5 or opcode == 6:
+            counts = self.branches.setdefault(ip, [0, 0])
+            counts[next_ip == ip + 3] += 1
+            self.next_ip = None
+        else:
+            self.next_ip = next_ip
+
+    def as_dict(self):
+        return {
+            'instructions': sum(self.opcodes.values()),
+            'opcodes': {self.names.get(opcode, str(opcode)): n for opcode, n in self.opcodes.most_common()},
+            'addresses': dict(self.addresses.most_common()),
+            'blocks': dict(self.blocks.most_common()),
+            'branches': {ip: {'taken': taken, 'not_taken': not_taken} for ip, (taken, not_taken) in self.branches.items()},
+        }
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def report(self, n=10):
+        """Hot spot report listing the `n` busiest opcodes, addresses, blocks and branches."""
+        total = sum(self.opcodes.values()) or 1
+        lines = [f'INSTRUCTIONS: {sum(self.opcodes.values())}', '', 'OPCODES:']
+        for opcode, count in self.opcodes.most_common(n):
+            lines.append(f'  {self.names.get(opcode, opcode):>22} {count:>10} {100 * count / total:6.2f}%')
+        lines += ['', 'ADDRESSES:']
+        for ip, count in self.addresses.most_common(n):
+            lines.append(f'  {ip:>22} {count:>10} {100 * count / total:6.2f}%')
+        lines += ['', 'BLOCKS:']
+        for ip, count in self.blocks.most_common(n):
+            lines.append(f'  {ip:>22} {count:>10}')
+        lines += ['', 'BRANCHES (TAKEN / NOT TAKEN):']
+        busiest = sorted(self.branches.items(), key=lambda item: -sum(item[1]))[:n]
+        for ip, (taken, not_taken) in busiest:
+            lines.append(f'  {ip:>22} {taken:>10} / {not_taken:<10} {100 * taken / (taken + not_taken):6.2f}% taken')
+        return '\n'.join(lines)
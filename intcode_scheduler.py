@@ -0,0 +1,86 @@
+from intcode import BUDGET_EXHAUSTED, WAITING_FOR_INPUT
+
+QUANTUM = 10000
+READY = 'ready'
+KILLED = 'killed'
+
+
+class Scheduler:
+    """Round robin time slicing of IntCode VMs.
+
+    Every turn a VM runs at most `quantum` instructions, so one VM stuck in a
+    long loop only delays the others by a quantum per round. VMs waiting for
+    input are skipped until something arrives in their input buffer, which
+    is usually the output buffer of another VM here. With `max_instructions`
+    a VM that has run that many instructions in total is stopped for good
+    and reported as KILLED.
+
+    `statuses` and `instructions` hold the status (READY, WAITING_FOR_INPUT,
+    HALTED or KILLED) and the number of instructions run of every VM, in
+    the order they were added.
+    """
+
+    def __init__(self, quantum=QUANTUM, max_instructions=None):
+        self.quantum = quantum
+        self.max_instructions = max_instructions
+        self.vms = []
+        self.statuses = []
+        self.instructions = []
+
+    def add(self, vm):
+        """Schedule `vm`; returns its index into `statuses` and `instructions`."""
+        self.vms.append(vm)
+        self.statuses.append(READY)
+        self.instructions.append(0)
+        return len(self.vms) - 1
+
+    def runnable(self, i):
+        status = self.statuses[i]
+        return status == READY or (status == WAITING_FOR_INPUT and len(self.vms[i].input_buffer))
+
+    def run_slice(self, i):
+        """Give VM `i` one quantum; returns its new status."""
+        vm = self.vms[i]
+        budget = self.quantum
+        if self.max_instructions is not None:
+            budget = min(budget, self.max_instructions - self.instructions[i])
+        if budget <= 0:
+            self.statuses[i] = KILLED
+            return KILLED
+        before = vm.instruction_count
+        status = vm.execute(max_instructions=budget)
+        self.instructions[i] += vm.instruction_count - before
+        if status == BUDGET_EXHAUSTED:
+            limit_reached = self.max_instructions is not None and self.instructions[i] >= self.max_instructions
+            status = KILLED if limit_reached else READY
+        self.statuses[i] = status
+        return status
+
+    def run(self):
+        """Run until every VM has halted, was killed or waits for input nobody is going to send.
+
+        Returns `statuses`.
+        """
+        while True:
+            ran = False
+            for i in range(len(self.vms)):
+                if self.runnable(i):
+                    self.run_slice(i)
+                    ran = True
+            if not ran:
+                return self.statuses
+
+    def report(self):
+        lines = [f'{"VM":>4} {"STATUS":<18} {"INSTRUCTIONS":>14}']
+        for i, (status, instructions) in enumerate(zip(self.statuses, self.instructions)):
+            lines.append(f'{i:>4} {status:<18} {instructions:>14}')
+        return '\n'.join(lines)
+
+
+def run_all(vms, quantum=QUANTUM, max_instructions=None):
+    """Run `vms` on one Scheduler; returns it for its statuses and instruction counts."""
+    scheduler = Scheduler(quantum, max_instructions)
+    for vm in vms:
+        scheduler.add(vm)
+    scheduler.run()
+    return scheduler
@@ -0,0 +1,210 @@
+from collections import Counter
+
+from intcode import IntCode, PagedMemory, decode
+
+
+class SymbolicFallback(Exception):
+    """A symbolic value reached a place where only a concrete value will do."""
+
+
+class Expression:
+    """Polynomial with integer coefficients over named symbols.
+
+    `terms` maps a monomial, the sorted tuple of its symbols with repetition,
+    to its coefficient. Arithmetic with a constant result gives a plain int,
+    so concrete values stay concrete. UNKNOWN stands for a value read through
+    a symbolic address; anything computed from it is unknown as well.
+    """
+
+    def __init__(self, terms):
+        self.terms = terms
+
+    @classmethod
+    def symbol(cls, name):
+        return cls({(name,): 1})
+
+    @staticmethod
+    def make(terms):
+        terms = {monomial: coefficient for monomial, coefficient in terms.items() if coefficient}
+        if not terms:
+            return 0
+        if list(terms) == [()]:
+            return terms[()]
+        return Expression(terms)
+
+    @staticmethod
+    def terms_of(value):
+        return value.terms if isinstance(value, Expression) else {(): value}
+
+    def __add__(self, other):
+        if self is UNKNOWN or other is UNKNOWN:
+            return UNKNOWN
+        terms = Counter(self.terms)
+        terms.update(self.terms_of(other))
+        return self.make(terms)
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+        if self is UNKNOWN or other is UNKNOWN:
+            return UNKNOWN
+        terms = Counter()
+        for monomial, coefficient in self.terms.items():
+            for other_monomial, other_coefficient in self.terms_of(other).items():
+                terms[tuple(sorted(monomial + other_monomial))] += coefficient * other_coefficient
+        return self.make(terms)
+
+    __rmul__ = __mul__
+
+    def __bool__(self):
+        raise SymbolicFallback(f'Truth value of symbolic expression {self}')
+
+    def substitute(self, values):
+        """Replace the symbols named in `values`; returns an int once no symbol is left."""
+        if self is UNKNOWN:
+            return UNKNOWN
+        terms = Counter()
+        for monomial, coefficient in self.terms.items():
+            remaining = []
+            for name in monomial:
+                if name in values:
+                    coefficient *= values[name]
+                else:
+                    remaining.append(name)
+            terms[tuple(remaining)] += coefficient
+        return self.make(terms)
+
+    def degree(self, name):
+        return max(monomial.count(name) for monomial in self.terms)
+
+    def __repr__(self):
+        if self is UNKNOWN:
+            return 'UNKNOWN'
+        parts = []
+        for monomial, coefficient in sorted(self.terms.items(), key=lambda item: (-len(item[0]), item[0])):
+            factors = ([str(coefficient)] if coefficient != 1 or not monomial else []) + list(monomial)
+            parts.append('*'.join(factors))
+        return ' + '.join(parts)
+
+
+UNKNOWN = Expression(None)
+
+
+def concrete(value):
+    if isinstance(value, Expression):
+        raise SymbolicFallback(f'Symbolic value {value} used where a concrete one is needed')
+    return value
+
+
+class SymbolicIntCode(IntCode):
+    """IntCode whose memory cells may hold Expressions.
+
+    Adds and multiplies build expressions. Reading through a symbolic address
+    yields UNKNOWN. Writing through a symbolic address, executing a symbolic
+    instruction word, comparing, jumping on or adjusting the relative base by
+    a symbolic value raises SymbolicFallback, after which the caller has to
+    fall back to concrete runs. Always runs on the reference engine, the
+    only one going through the handler methods overridden here, and on
+    list pages whatever IntCode.MEMORY says.
+    """
+    MEMORY = PagedMemory
+
+    def __init__(self, memory, input_buffer=None, output_buffer=None):
+        super().__init__(memory, input_buffer, output_buffer, engine='reference')
+
+    def read_memory(self, address):
+        if isinstance(address, Expression):
+            return UNKNOWN
+        return super().read_memory(address)
+
+    def write_memory(self, address, value):
+        super().write_memory(concrete(address), value)
+
+    def decode_instruction(self, address):
+        return decode(concrete(self.read_memory(address)))
+
+    def jump_if_true(self):
+        self.ip += 1
+        a = self.get_parameter_address()
+        b = self.get_parameter_address()
+        condition, target = concrete(self.read_memory(a)), self.read_memory(b)
+        if condition:
+            self.ip = concrete(target)
+
+    def jump_if_false(self):
+        self.ip += 1
+        a = self.get_parameter_address()
+        b = self.get_parameter_address()
+        condition, target = concrete(self.read_memory(a)), self.read_memory(b)
+        if not condition:
+            self.ip = concrete(target)
+
+    def less_than(self):
+        self.ip += 1
+        a, b, c = (
+            self.get_parameter_address(),
+            self.get_parameter_address(),
+            self.get_parameter_address(),
+        )
+        self.write_memory(c, int(concrete(self.read_memory(a)) < concrete(self.read_memory(b))))
+
+    def equals(self):
+        self.ip += 1
+        a, b, c = (
+            self.get_parameter_address(),
+            self.get_parameter_address(),
+            self.get_parameter_address(),
+        )
+        self.write_memory(c, int(concrete(self.read_memory(a)) == concrete(self.read_memory(b))))
+
+    def adjust_relative_base(self):
+        self.ip += 1
+        self.relative_base += concrete(self.read_memory(self.get_parameter_address()))
+
+
+def solve_linear(expression, name, target, candidates):
+    """Values from `candidates` for which `expression` evaluates to `target`."""
+    if not isinstance(expression, Expression):
+        return list(candidates) if expression == target else []
+    if expression.degree(name) == 1 and set(expression.terms) <= {(), (name,)}:
+        offset = target - expression.terms.get((), 0)
+        slope = expression.terms[(name,)]
+        value, remainder = divmod(offset, slope)
+        return [value] if not remainder and value in candidates else []
+    return [value for value in candidates if expression.substitute({name: value}) == target]
+
+
+def solve_noun_verb(program, target, nouns=range(100), verbs=range(100)):
+    """Find (noun, verb) so that memory[0] ends up as `target` (day 2).
+
+    The program runs once with symbolic noun and verb and the resulting
+    formula for memory[0] is solved directly. If the program branches on
+    them or uses them in ways a formula cannot follow, every pair is run
+    concretely instead. Returns None when no pair works.
+    """
+    vm = SymbolicIntCode(program)
+    vm.write_memory(1, Expression.symbol('noun'))
+    vm.write_memory(2, Expression.symbol('verb'))
+    try:
+        vm.run()
+        result = vm.memory[0]
+    except SymbolicFallback:
+        result = UNKNOWN
+
+    if result is not UNKNOWN:
+        for noun in nouns:
+            partial = result.substitute({'noun': noun}) if isinstance(result, Expression) else result
+            for verb in solve_linear(partial, 'verb', target, verbs):
+                return noun, verb
+        return None
+
+    pristine = IntCode(program)
+    for noun in nouns:
+        for verb in verbs:
+            vm = pristine.fork()
+            vm.write_memory(1, noun)
+            vm.write_memory(2, verb)
+            vm.run()
+            if vm.memory[0] == target:
+                return noun, verb
+    return None